@@ -14,3 +14,9 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'homebite.settings')
 
 application = get_asgi_application()
+
+from django.conf import settings
+
+if settings.TEMPLATE_PRELOAD:
+    from homebite.template_loading import preload_templates
+    preload_templates()
@@ -0,0 +1,286 @@
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from functools import partial
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import FileResponse, JsonResponse
+from .metrics import CACHE_LOOKUPS, REQUEST_DURATION, REQUEST_QUERIES
+
+logger = logging.getLogger(__name__)
+
+# Per-request counters (SQL queries and their time, top-level template
+# renders, cache hits/misses) kept in a context variable, so they follow a
+# request into sync_to_async threads. RequestStatsMiddleware reports them as
+# a Server-Timing header, adds them to per-view totals for the staff stats
+# endpoint and checks them against QUERY_BUDGETS. Streaming responses run
+# their queries while the body is sent, after the headers: they get no
+# Server-Timing and are recorded once the body is exhausted or closed.
+_current = ContextVar("request_stats", default=None)
+
+_totals_lock = threading.Lock()
+_view_totals = {}
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class RequestStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.seconds = None
+
+    def finish(self):
+        self.seconds = time.perf_counter() - self.started
+
+    def as_dict(self):
+        return {
+            "queries": self.queries,
+            "db_ms": self.db_seconds * 1000,
+            "template_ms": self.template_seconds * 1000,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "total_ms": (self.seconds or 0) * 1000,
+        }
+
+    def server_timing(self):
+        return ", ".join([
+            f'db;dur={self.db_seconds * 1000:.1f};desc="{self.queries} queries"',
+            f"tpl;dur={self.template_seconds * 1000:.1f}",
+            f'cache;desc="{self.cache_hits} hits, {self.cache_misses} misses"',
+            f"total;dur={(self.seconds or 0) * 1000:.1f}",
+        ])
+
+
+def _record_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_seconds += time.perf_counter() - start
+
+
+def install_query_recorder(sender=None, connection=None, **kwargs):
+    # execute_wrappers survive reconnects, so only add it once
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def _install_on_open_connections():
+    # Connections opened before this module was imported missed the signal
+    for connection in connections.all(initialized_only=True):
+        install_query_recorder(connection=connection)
+
+
+connection_created.connect(install_query_recorder)
+
+
+def record_template_render(seconds):
+    stats = _current.get()
+    if stats is not None:
+        stats.template_seconds += seconds
+
+
+def record_cache_lookup(hits, misses):
+    if hits:
+        CACHE_LOOKUPS.inc(hits, result="hit")
+    if misses:
+        CACHE_LOOKUPS.inc(misses, result="miss")
+    stats = _current.get()
+    if stats is not None:
+        stats.cache_hits += hits
+        stats.cache_misses += misses
+
+
+_MISSING = object()
+
+
+class CountingCache:
+    # Wraps a cache so lookups count as hits or misses of the current request
+    def __init__(self, cache):
+        self._cache = cache
+
+    def __getattr__(self, name):
+        return getattr(self._cache, name)
+
+    def get(self, key, default=None, version=None):
+        value = self._cache.get(key, _MISSING, version=version)
+        record_cache_lookup(value is not _MISSING, value is _MISSING)
+        return default if value is _MISSING else value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = self._cache.get_many(keys, version=version)
+        record_cache_lookup(len(found), len(keys) - len(found))
+        return found
+
+    async def aget(self, key, default=None, version=None):
+        value = await self._cache.aget(key, _MISSING, version=version)
+        record_cache_lookup(value is not _MISSING, value is _MISSING)
+        return default if value is _MISSING else value
+
+    async def aget_many(self, keys, version=None):
+        keys = list(keys)
+        found = await self._cache.aget_many(keys, version=version)
+        record_cache_lookup(len(found), len(keys) - len(found))
+        return found
+
+
+def _add_to_totals(view_name, stats):
+    with _totals_lock:
+        totals = _view_totals.setdefault(view_name, {
+            "count": 0, "total_ms": 0.0, "max_ms": 0.0, "queries": 0, "max_queries": 0,
+            "db_ms": 0.0, "template_ms": 0.0, "cache_hits": 0, "cache_misses": 0,
+        })
+        values = stats.as_dict()
+        totals["count"] += 1
+        totals["max_ms"] = max(totals["max_ms"], values["total_ms"])
+        totals["max_queries"] = max(totals["max_queries"], values["queries"])
+        for key in ("total_ms", "queries", "db_ms", "template_ms", "cache_hits", "cache_misses"):
+            totals[key] += values[key]
+
+
+def view_stats():
+    # {view name: totals plus per-request averages} for this process
+    with _totals_lock:
+        totals = {name: dict(values) for name, values in _view_totals.items()}
+    for values in totals.values():
+        count = values["count"]
+        values["avg_ms"] = values["total_ms"] / count
+        values["avg_queries"] = values["queries"] / count
+        values["avg_db_ms"] = values["db_ms"] / count
+        values["avg_template_ms"] = values["template_ms"] / count
+        lookups = values["cache_hits"] + values["cache_misses"]
+        values["cache_hit_ratio"] = values["cache_hits"] / lookups if lookups else None
+    return totals
+
+
+def reset_view_stats():
+    with _totals_lock:
+        _view_totals.clear()
+
+
+def check_query_budget(view_name, stats):
+    budget = settings.QUERY_BUDGETS.get(view_name)
+    if budget is None or stats.queries <= budget:
+        return
+    message = f"{view_name} ran {stats.queries} queries, over its budget of {budget}"
+    if settings.QUERY_BUDGET_STRICT:
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+class _StreamedBody:
+    # Keeps the request's stats current while a streaming body is iterated
+    def __init__(self, content, stats, on_close):
+        self._content = content
+        self._stats = stats
+        self._on_close = on_close
+
+    def close(self):
+        if self._on_close is not None:
+            on_close, self._on_close = self._on_close, None
+            on_close()
+
+
+class _SyncStreamedBody(_StreamedBody):
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        token = _current.set(self._stats)
+        try:
+            return next(self._content)
+        except StopIteration:
+            self.close()
+            raise
+        finally:
+            _current.reset(token)
+
+
+class _AsyncStreamedBody(_StreamedBody):
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        token = _current.set(self._stats)
+        try:
+            return await anext(self._content)
+        except StopAsyncIteration:
+            self.close()
+            raise
+        finally:
+            _current.reset(token)
+
+
+class RequestStatsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        _install_on_open_connections()
+        stats = RequestStats()
+        token = _current.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.process(request, response, stats)
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.process(request, response, stats)
+
+    def process(self, request, response, stats):
+        match = getattr(request, "resolver_match", None)
+        view_name = match.view_name if match else "<unresolved>"
+        response.request_stats = stats
+        # Files are left alone so servers can still send them with sendfile
+        if response.streaming and not isinstance(response, FileResponse):
+            body = _AsyncStreamedBody if response.is_async else _SyncStreamedBody
+            response.streaming_content = body(response.streaming_content, stats, partial(self.record, view_name, stats))
+            return response
+        self.record(view_name, stats)
+        if settings.SERVER_TIMING:
+            response["Server-Timing"] = stats.server_timing()
+        return response
+
+    def record(self, view_name, stats):
+        stats.finish()
+        _add_to_totals(view_name, stats)
+        REQUEST_DURATION.observe(stats.seconds, view=view_name)
+        REQUEST_QUERIES.observe(stats.queries, view=view_name)
+        check_query_budget(view_name, stats)
+
+
+@staff_member_required
+def request_stats(request):
+    from .template_loading import render_stats
+
+    return JsonResponse({"views": view_stats(), "templates": render_stats()})
@@ -0,0 +1,90 @@
+import hashlib
+import mimetypes
+import os
+import re
+import stat
+from pathlib import PurePosixPath
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+# Uploads are stored under the SHA-256 of their content, so a photo uploaded
+# for fifty branches of a chain is one file, and a URL's bytes never change:
+# browsers and CDNs may keep media for a year without revalidating.
+HASHED_NAME = re.compile(r"(?:^|/)([0-9a-f]{64})\.[A-Za-z0-9]+$")
+IMMUTABLE = "public, max-age=31536000, immutable"
+# Files from before content hashing (or copied in by hand) can change
+REVALIDATE = "public, max-age=3600"
+
+
+class ContentHashStorage(FileSystemStorage):
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+
+        # Keep the top directory (restaurant_images/, food_images/) to tell uploads apart
+        path = PurePosixPath(name.replace("\\", "/"))
+        top = path.parts[0] if len(path.parts) > 1 else ""
+        hex_digest = digest.hexdigest()
+        name = str(PurePosixPath(top, hex_digest[:2], hex_digest + path.suffix.lower()))
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length)
+
+    def delete(self, name):
+        # Rows with the same bytes share the file; it goes with the last one
+        if not file_in_use(name):
+            super().delete(name)
+
+
+def file_in_use(name):
+    # Models storing files here say whether any of their rows refers to one
+    return any(
+        model.references_file(name) for model in apps.get_models() if hasattr(model, "references_file")
+    )
+
+
+def _file_etag(path, file_stat):
+    match = HASHED_NAME.search(path)
+    if match:
+        return f'"{match[1]}"'
+    return f'"{file_stat.st_mtime_ns:x}-{file_stat.st_size:x}"'
+
+
+@require_safe
+def serve_media(request, path):
+    try:
+        fullpath = safe_join(settings.MEDIA_ROOT, path)
+        file_stat = os.stat(fullpath)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404
+    if not stat.S_ISREG(file_stat.st_mode):
+        raise Http404
+    etag = _file_etag(path, file_stat)
+    last_modified = int(file_stat.st_mtime)
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        if settings.MEDIA_ACCEL_REDIRECT:
+            # nginx sends the file from its internal location
+            response = HttpResponse(content_type=mimetypes.guess_type(path)[0] or "application/octet-stream")
+            response["X-Accel-Redirect"] = settings.MEDIA_ACCEL_REDIRECT.rstrip("/") + "/" + path
+        else:
+            response = FileResponse(open(fullpath, "rb"))
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    response["Cache-Control"] = IMMUTABLE if HASHED_NAME.search(path) else REVALIDATE
+    return response
@@ -0,0 +1,265 @@
+import atexit
+import fcntl
+import hmac
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+# A small in-process metrics registry rendered in the Prometheus text format
+# at /metrics. Each process counts in memory under a lock. With METRICS_DIR
+# set (several gunicorn/uvicorn workers), every process also writes its
+# values to its own JSON file there, at most every FLUSH_SECONDS, and
+# /metrics sums the files of all processes. Files of processes that have
+# exited are folded into one archive file, so counters don't drop when a
+# worker is recycled and scrapes don't read a file per past worker.
+FLUSH_SECONDS = 1.0
+ARCHIVE_FILE = "archive.json"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._values = {}
+        self._pid = None
+        self._file = None
+        self._flushed = 0.0
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+
+    def _check_fork(self):
+        # A forked worker starts counting from zero in a file of its own
+        pid = os.getpid()
+        if pid != self._pid:
+            self._pid = pid
+            self._values = {}
+            self._file = None
+
+    def add(self, name, labels, amount):
+        with self._lock:
+            self._check_fork()
+            key = (name, labels)
+            self._values[key] = self._values.get(key, 0) + amount
+        self.maybe_flush()
+
+    def observe(self, name, labels, buckets, value):
+        with self._lock:
+            self._check_fork()
+            key = (name, labels)
+            # Per-bucket counts (not cumulative) ending with +Inf, then sum and count
+            series = self._values.setdefault(key, [0] * (len(buckets) + 3))
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            else:
+                series[len(buckets)] += 1
+            series[-2] += value
+            series[-1] += 1
+        self.maybe_flush()
+
+    def snapshot(self):
+        with self._lock:
+            self._check_fork()
+            return [
+                [name, list(labels), value[:] if isinstance(value, list) else value]
+                for (name, labels), value in self._values.items()
+            ]
+
+    def maybe_flush(self, force=False):
+        directory = settings.METRICS_DIR
+        if not directory or (not force and time.monotonic() - self._flushed < FLUSH_SECONDS):
+            return
+        # One writer at a time, so an older snapshot can't replace a newer one
+        if not self._flush_lock.acquire(blocking=force):
+            return
+        try:
+            self._flushed = time.monotonic()
+            values = self.snapshot()
+            if self._file is None:
+                self._file = Path(directory) / f"{self._pid}-{time.time_ns()}.json"
+            _write(self._file, values)
+        finally:
+            self._flush_lock.release()
+
+    def collect(self):
+        # {(name, label values): value} over every process writing to METRICS_DIR
+        if not settings.METRICS_DIR:
+            return {(name, tuple(labels)): value for name, labels, value in self.snapshot()}
+        self.maybe_flush(force=True)
+        directory = Path(settings.METRICS_DIR)
+        # One process at a time folds exited workers into the archive
+        with open(directory / ".lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            archive = directory / ARCHIVE_FILE
+            merged = _merge({}, _read(archive))
+            exited = [path for path in directory.glob("*-*.json") if not _process_alive(path)]
+            if exited:
+                for path in exited:
+                    merged = _merge(merged, _read(path))
+                _write(archive, [[name, list(labels), value] for (name, labels), value in merged.items()])
+                for path in exited:
+                    path.unlink(missing_ok=True)
+        for path in directory.glob("*-*.json"):
+            merged = _merge(merged, _read(path))
+        return merged
+
+    def render(self):
+        values = self.collect()
+        lines = []
+        for name, metric in sorted(self.metrics.items()):
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.type}")
+            for (series_name, labels), value in sorted(values.items()):
+                if series_name == name:
+                    lines.extend(metric.render(labels, value))
+        return "\n".join(lines) + "\n"
+
+
+def _read(path):
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return []
+
+
+def _write(path, values):
+    # Written whole then renamed, so readers never see half a file
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(values, f)
+    os.replace(tmp, path)
+
+
+def _merge(merged, values):
+    for name, labels, value in values:
+        key = (name, tuple(labels))
+        if isinstance(value, list):
+            current = merged.setdefault(key, [0] * len(value))
+            merged[key] = [a + b for a, b in zip(current, value)]
+        else:
+            merged[key] = merged.get(key, 0) + value
+    return merged
+
+
+def _process_alive(path):
+    # Per-process files are named "<pid>-<start ns>.json"
+    pid = int(path.name.split("-", 1)[0])
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+REGISTRY = Registry()
+atexit.register(REGISTRY.maybe_flush, force=True)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_number(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, help, labels=(), registry=REGISTRY):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.registry = registry
+        registry.register(self)
+
+    def _label_values(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} takes labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+
+class Counter(Metric):
+    # Name it with the conventional _total suffix
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        self.registry.add(self.name, self._label_values(labels), amount)
+
+    def render(self, labels, value):
+        return [f"{self.name}{_format_labels(self.labels, labels)} {_format_number(value)}"]
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        super().__init__(name, help, labels, registry)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        self.registry.observe(self.name, self._label_values(labels), self.buckets, value)
+
+    def render(self, labels, value):
+        lines = []
+        cumulative = 0
+        for bound, count in zip((*self.buckets, math.inf), value[:-2]):
+            cumulative += count
+            le = _format_labels(self.labels, labels, [("le", _format_number(bound))])
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+        lines.append(f"{self.name}_sum{_format_labels(self.labels, labels)} {_format_number(value[-2])}")
+        lines.append(f"{self.name}_count{_format_labels(self.labels, labels)} {value[-1]}")
+        return lines
+
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Time spent handling a request, by URL name.", labels=("view",)
+)
+REQUEST_QUERIES = Histogram(
+    "http_request_queries", "SQL queries run per request, by URL name.", labels=("view",),
+    buckets=(1, 2, 5, 10, 20, 50, 100),
+)
+CACHE_LOOKUPS = Counter(
+    "cache_lookups_total", "Cache lookups through the app's cache helpers, by result (hit or miss).", labels=("result",)
+)
+
+
+def _has_metrics_token(request):
+    # Scrapers send "Authorization: Bearer <METRICS_TOKEN>"
+    if not settings.METRICS_TOKEN:
+        return False
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    return scheme.lower() == "bearer" and hmac.compare_digest(token.encode(), settings.METRICS_TOKEN.encode())
+
+
+def metrics_view(request):
+    # For scrapers with the token, and for staff. Not by client address:
+    # behind a local nginx every request comes from 127.0.0.1
+    if not _has_metrics_token(request) and not request.user.is_staff:
+        return HttpResponseForbidden()
+    return HttpResponse(REGISTRY.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
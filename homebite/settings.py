@@ -17,6 +17,9 @@ import sys
 BASE_DIR = Path(__file__).resolve().parent.parent
 MEDIA_URL = '/media/'  
 MEDIA_ROOT = BASE_DIR / 'media'
+# Set to an nginx `internal` location aliased to MEDIA_ROOT (e.g. /protected-media/)
+# to have nginx send media files; Django still sets the cache headers and ETag
+MEDIA_ACCEL_REDIRECT = os.environ.get('MEDIA_ACCEL_REDIRECT')
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
 
@@ -38,12 +41,15 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'accounts.apps.AccountsConfig',
     'restaurants.apps.RestaurantsConfig',
     'django_filters',
 ]
 
 MIDDLEWARE = [
+    # First, so its counts include the other middleware
+    'homebite.instrumentation.RequestStatsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -59,19 +65,29 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # Always cached, whatever DEBUG is; runserver's autoreloader still
+            # resets it when a template changes. Also records render times.
+            'loaders': [
+                ('homebite.template_loading.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
 
 WSGI_APPLICATION = 'homebite.wsgi.application'
 
+# Compile every template when a wsgi/asgi worker starts instead of on first render
+TEMPLATE_PRELOAD = os.environ.get('TEMPLATE_PRELOAD', str(not DEBUG)) == 'True'
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
@@ -123,11 +139,65 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+STORAGES = {
+    # Uploads are named by content hash and deduplicated (homebite/media.py)
+    'default': {'BACKEND': 'homebite.media.ContentHashStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Point CACHE_BACKEND/CACHE_LOCATION at a shared cache (e.g. Redis, Memcached)
+# when running several workers, so list cache invalidation reaches all of them
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'homebite'),
+    }
+}
+
+# Serve the list, detail and menu pages from restaurants/async_views.py;
+# only worthwhile when running under ASGI (homebite.asgi)
+RESTAURANTS_ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS', 'False') == 'True'
+
+# Dotted path to the restaurant search backend; unset picks trigram search
+# on Postgres and plain icontains everywhere else (see restaurants/search.py)
+RESTAURANT_SEARCH_BACKEND = os.environ.get('RESTAURANT_SEARCH_BACKEND')
+
+# Threads that build image thumbnails once an upload commits (restaurants/images.py);
+# 0 builds them inline, on the request that saved the image
+RESTAURANT_IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', '2'))
+
+# Per-request query/DB/template/cache numbers (homebite/instrumentation.py).
+# The Server-Timing header shows them to anyone, so it's off by default in production.
+SERVER_TIMING = os.environ.get('SERVER_TIMING', str(DEBUG)) == 'True'
+# Most SQL queries a view may run, by URL name. Going over logs a warning,
+# or fails the request (and so the test) when QUERY_BUDGET_STRICT is on.
+QUERY_BUDGETS = {
+    'restaurants:restaurant_list': 16,
+    'restaurants:restaurant_detail': 10,
+    'restaurants:review_list': 5,
+    'restaurants:restaurant_foods': 8,
+    'restaurants:dish_search': 8,
+    'restaurants:toggle_bookmark': 7,
+    'restaurants:toggle_visited': 7,
+    'restaurants:bulk_bookmark': 7,
+    'restaurants:bulk_visited': 7,
+    'restaurants:add_review': 20,
+    'restaurants:delete_review': 14,
+}
+QUERY_BUDGET_STRICT = False
+
+# Metrics at /metrics (homebite/metrics.py), for staff and for scrapers
+# sending "Authorization: Bearer <METRICS_TOKEN>". With several worker
+# processes, point METRICS_DIR at a directory they share on this host
+# (emptied on deploy) so /metrics adds up all of them.
+METRICS_DIR = os.environ.get('METRICS_DIR')
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
 from decouple import config
 
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
@@ -149,6 +219,7 @@ if 'test' in sys.argv:
     PASSWORD_HASHERS = [
         'django.contrib.auth.hashers.MD5PasswordHasher',
     ]
+    QUERY_BUDGET_STRICT = True
 
 if not DEBUG:
     CSRF_COOKIE_SECURE = True
@@ -0,0 +1,102 @@
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from functools import partial
+from pathlib import Path
+from django.template import TemplateSyntaxError, engines
+from django.template.backends.django import DjangoTemplates
+from django.template.loaders import cached
+from .instrumentation import record_template_render
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_SUFFIXES = (".html", ".txt")
+
+_stats_lock = threading.Lock()
+_render_stats = {}
+# Nested {% include %} renders are part of their parent's time
+_render_depth = ContextVar("template_render_depth", default=0)
+
+
+class Loader(cached.Loader):
+    # The cached loader, with every compiled template timing its own renders.
+    # Times include nested {% include %}s, which are timed separately as well.
+    def get_template(self, template_name, skip=None):
+        template = super().get_template(template_name, skip)
+        if not getattr(template, "_render_timed", False):
+            template._render = partial(_timed_render, template)
+            template._render_timed = True
+        return template
+
+
+def _timed_render(template, context):
+    # Looked up on the class at call time so the test runner's instrumented
+    # _render (which feeds response.context) still runs
+    start = time.perf_counter()
+    token = _render_depth.set(_render_depth.get() + 1)
+    try:
+        return type(template)._render(template, context)
+    finally:
+        _render_depth.reset(token)
+        seconds = time.perf_counter() - start
+        _record_render(template.name, seconds)
+        if not _render_depth.get():
+            record_template_render(seconds)
+
+
+def _record_render(name, seconds):
+    with _stats_lock:
+        count, total, slowest = _render_stats.get(name, (0, 0.0, 0.0))
+        _render_stats[name] = (count + 1, total + seconds, max(slowest, seconds))
+    logger.debug("Rendered %s in %.2f ms", name, seconds * 1000)
+
+
+def render_stats():
+    # {template name: {"count", "total_ms", "avg_ms", "max_ms"}} for this process
+    with _stats_lock:
+        stats = dict(_render_stats)
+    return {
+        name: {
+            "count": count,
+            "total_ms": total * 1000,
+            "avg_ms": total * 1000 / count,
+            "max_ms": slowest * 1000,
+        }
+        for name, (count, total, slowest) in stats.items()
+    }
+
+
+def reset_render_stats():
+    with _stats_lock:
+        _render_stats.clear()
+
+
+def _template_names(engine):
+    for loader in engine.template_loaders:
+        for source_loader in getattr(loader, "loaders", [loader]):
+            for directory in source_loader.get_dirs():
+                directory = Path(directory)
+                for path in directory.rglob("*"):
+                    if path.suffix in TEMPLATE_SUFFIXES:
+                        yield path.relative_to(directory).as_posix()
+
+
+def preload_templates():
+    # Compiles every template into the cached loaders, so no request pays for
+    # a first render. Called from wsgi.py/asgi.py when TEMPLATE_PRELOAD is on.
+    start = time.perf_counter()
+    loaded = 0
+    for backend in engines.all():
+        if not isinstance(backend, DjangoTemplates):
+            continue
+        for name in sorted(set(_template_names(backend.engine))):
+            try:
+                backend.engine.get_template(name)
+            except TemplateSyntaxError as e:
+                # e.g. templates of an app whose tag library isn't installed
+                logger.warning("Could not preload template %s: %s", name, e)
+            else:
+                loaded += 1
+    logger.info("Preloaded %d templates in %.0f ms", loaded, (time.perf_counter() - start) * 1000)
+    return loaded
@@ -14,17 +14,21 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
 from django.contrib import admin
-from django.urls import path
+from django.urls import path, re_path
 from django.urls import include 
 from django.conf import settings
-from django.conf.urls.static import static
+from .instrumentation import request_stats
+from .media import serve_media
+from .metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('accounts/', include('accounts.urls')),
+    path('stats/requests/', request_stats, name='request_stats'),
+    path('metrics', metrics_view, name='metrics'),
+    # Served in production too, with long-lived cache headers; see homebite/media.py
+    re_path(r'^%s(?P<path>.+)$' % re.escape(settings.MEDIA_URL.lstrip('/')), serve_media, name='media'),
     path('', include('restaurants.urls', namespace="restaurants")),
 ]
-
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
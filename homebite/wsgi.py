@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'homebite.settings')
 
 application = get_wsgi_application()
+
+from django.conf import settings
+
+if settings.TEMPLATE_PRELOAD:
+    from homebite.template_loading import preload_templates
+    preload_templates()
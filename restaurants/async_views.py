@@ -0,0 +1,169 @@
+import asyncio
+from asgiref.sync import sync_to_async
+from django.core.paginator import InvalidPage, Page
+from django.db.models import aprefetch_related_objects
+from django.http import Http404
+from django.shortcuts import aget_object_or_404
+from django.template.response import TemplateResponse
+from django.views import View
+from .cache import (
+    aget_cached_list_count,
+    aget_cached_list_page,
+    alist_page_cache_key,
+    amark_user_flags,
+    auncached_cards,
+    aset_cached_list_count,
+    aset_cached_list_page,
+    avisited_restaurant_ids,
+    normalize_list_params,
+)
+from .filters import RestaurantFilter
+from .metrics import record_filter_combination
+from .managers import cover_images_prefetch
+from .models import Food, Restaurant
+from .pagination import KeysetPaginator, PrecountedPaginator, order_by_ids, validate_page_number
+from .views import (
+    MENU_PAGE_SIZE,
+    REVIEW_ORDERING,
+    REVIEWS_PER_PAGE,
+    menu_context,
+    menu_cuisines,
+    selected_menu_cuisine,
+)
+
+# ASGI-native counterparts of RestaurantListView, RestaurantDetailView and
+# FoodListView. They render the same templates with the same context, but
+# query through the async ORM instead of being run in a thread by the handler.
+# restaurants/urls.py routes to them when settings.RESTAURANTS_ASYNC_VIEWS is on.
+
+
+async def afetch(queryset):
+    return [obj async for obj in queryset]
+
+
+class AsyncRestaurantListView(View):
+    template_name = "restaurants/list.html"
+    paginate_by = 10
+    ordering = ['-average_rating']
+
+    async def get(self, request, *args, **kwargs):
+        request.user = await request.auser()
+        queryset = Restaurant.objects.order_by(*self.ordering)
+        filterset = RestaurantFilter(request.GET or None, queryset=queryset, request=request)
+        record_filter_combination(filterset)
+
+        valid = True
+        if filterset.is_bound:
+            # Validating the form looks up the selected cuisines and the
+            # bookmarked/visited filters read the user's ID sets; both are sync-only
+            valid, queryset = await sync_to_async(self.filter_queryset)(filterset)
+        cacheable = valid and filterset.is_shareable()
+        page_number = request.GET.get("page") or 1
+        params = normalize_list_params(request.GET, filterset.filters)
+        key = await alist_page_cache_key(params, page_number)
+
+        cached = await aget_cached_list_page(key) if cacheable else None
+        count = cached["count"] if cached else None
+        if count is None and cacheable:
+            count = await aget_cached_list_count(params)
+        if count is None:
+            count = await queryset.acount()
+
+        paginator = PrecountedPaginator(queryset, self.paginate_by, count=count)
+        try:
+            number = validate_page_number(paginator, page_number)
+        except InvalidPage as e:
+            raise Http404(str(e))
+
+        if cached:
+            restaurants = [r async for r in order_by_ids(queryset, cached["ids"])]
+        else:
+            bottom = (number - 1) * self.paginate_by
+            restaurants = [r async for r in queryset[bottom:bottom + self.paginate_by]]
+            if cacheable:
+                await aset_cached_list_page(key, [r.pk for r in restaurants], count)
+                await aset_cached_list_count(params, count)
+
+        await amark_user_flags(restaurants, request.user)
+        await aprefetch_related_objects(await auncached_cards(restaurants), cover_images_prefetch())
+        page = Page(restaurants, number, paginator)
+        context = {
+            "view": self,
+            "filter": filterset,
+            "paginator": paginator,
+            "page_obj": page,
+            "is_paginated": page.has_other_pages(),
+            "object_list": restaurants,
+            "restaurants": restaurants,
+        }
+        return TemplateResponse(request, self.template_name, context)
+
+
+    def filter_queryset(self, filterset):
+        if filterset.is_valid():
+            return True, filterset.qs
+        return False, filterset.queryset.none()
+
+
+class AsyncRestaurantDetailView(View):
+    template_name = "restaurants/detail.html"
+
+    async def get(self, request, pk, *args, **kwargs):
+        request.user = await request.auser()
+        restaurant = await aget_object_or_404(Restaurant, pk=pk)
+
+        # The detail page's independent lookups are awaited together
+        reviews = KeysetPaginator(
+            restaurant.reviews.select_related('user'), REVIEW_ORDERING, REVIEWS_PER_PAGE
+        )
+        review_page, visited_ids, images, cuisines = await asyncio.gather(
+            reviews.apage(),
+            avisited_restaurant_ids(request.user),
+            afetch(restaurant.images.all()),
+            afetch(restaurant.cuisines.all()),
+        )
+        restaurant.is_visited = restaurant.pk in visited_ids
+
+        context = {
+            "view": self,
+            "object": restaurant,
+            "restaurant": restaurant,
+            "reviews": review_page,
+            "rating_stats": restaurant.get_rating_stats(),
+            "images": images,
+            "cuisines": cuisines,
+        }
+        return TemplateResponse(request, self.template_name, context)
+
+
+class AsyncFoodListView(View):
+    template_name = "foods/list.html"
+
+    async def get(self, request, restaurant_id, *args, **kwargs):
+        restaurant = await aget_object_or_404(Restaurant, pk=restaurant_id)
+        cuisine_id = selected_menu_cuisine(request)
+        menu = Food.objects.menu_for(restaurant, cuisine_id)
+
+        paginator = PrecountedPaginator(menu, MENU_PAGE_SIZE, count=await menu.acount())
+        try:
+            number = validate_page_number(paginator, request.GET.get("page") or 1)
+        except InvalidPage as e:
+            raise Http404(str(e))
+
+        bottom = (number - 1) * MENU_PAGE_SIZE
+        foods, cuisines = await asyncio.gather(
+            afetch(menu[bottom:bottom + MENU_PAGE_SIZE]),
+            afetch(menu_cuisines(restaurant)),
+        )
+        page = Page(foods, number, paginator)
+        context = {
+            "view": self,
+            "paginator": paginator,
+            "page_obj": page,
+            "is_paginated": page.has_other_pages(),
+            "object_list": foods,
+            "foods": foods,
+            "cuisines": cuisines,
+            **menu_context(restaurant, cuisine_id),
+        }
+        return TemplateResponse(request, self.template_name, context)
@@ -0,0 +1,201 @@
+import hashlib
+import time
+from urllib.parse import urlencode
+from django.core.cache import cache as default_cache
+from django.core.cache.utils import make_template_fragment_key
+from homebite.instrumentation import CountingCache
+
+USER_SET_TIMEOUT = 60 * 60
+LIST_PAGE_TIMEOUT = 5 * 60
+LIST_VERSION_KEY = "restaurants:list:version"
+# Must match the {% cache %} fragment name in restaurant_card.html
+CARD_FRAGMENT = "restaurant_card"
+
+# Lookups here show up as cache hits/misses in the request stats
+cache = CountingCache(default_cache)
+
+
+def _user_set_key(kind, user_id):
+    return f"restaurants:user:{user_id}:{kind}"
+
+
+def _user_restaurant_ids(kind, model, user):
+    if not user.is_authenticated:
+        return frozenset()
+    key = _user_set_key(kind, user.pk)
+    ids = cache.get(key)
+    if ids is None:
+        ids = frozenset(model.objects.filter(user=user).values_list('restaurant_id', flat=True))
+        cache.set(key, ids, USER_SET_TIMEOUT)
+    return ids
+
+
+async def _auser_restaurant_ids(kind, model, user):
+    if not user.is_authenticated:
+        return frozenset()
+    key = _user_set_key(kind, user.pk)
+    ids = await cache.aget(key)
+    if ids is None:
+        ids = frozenset([pk async for pk in model.objects.filter(user=user).values_list('restaurant_id', flat=True)])
+        await cache.aset(key, ids, USER_SET_TIMEOUT)
+    return ids
+
+
+def bookmarked_restaurant_ids(user):
+    from .models import Bookmark
+    return _user_restaurant_ids('bookmarked', Bookmark, user)
+
+
+def visited_restaurant_ids(user):
+    from .models import Visited
+    return _user_restaurant_ids('visited', Visited, user)
+
+
+async def abookmarked_restaurant_ids(user):
+    from .models import Bookmark
+    return await _auser_restaurant_ids('bookmarked', Bookmark, user)
+
+
+async def avisited_restaurant_ids(user):
+    from .models import Visited
+    return await _auser_restaurant_ids('visited', Visited, user)
+
+
+def invalidate_user_bookmarks(user_id):
+    cache.delete(_user_set_key('bookmarked', user_id))
+
+
+def invalidate_user_visited(user_id):
+    cache.delete(_user_set_key('visited', user_id))
+
+
+def mark_user_flags(restaurants, user):
+    # Sets is_bookmarked/is_visited from the cached sets, so the list query
+    # itself stays the same for every user
+    bookmarked = bookmarked_restaurant_ids(user)
+    visited = visited_restaurant_ids(user)
+    for restaurant in restaurants:
+        restaurant.is_bookmarked = restaurant.pk in bookmarked
+        restaurant.is_visited = restaurant.pk in visited
+    return restaurants
+
+
+async def amark_user_flags(restaurants, user):
+    bookmarked = await abookmarked_restaurant_ids(user)
+    visited = await avisited_restaurant_ids(user)
+    for restaurant in restaurants:
+        restaurant.is_bookmarked = restaurant.pk in bookmarked
+        restaurant.is_visited = restaurant.pk in visited
+    return restaurants
+
+
+def list_cache_version():
+    version = cache.get(LIST_VERSION_KEY)
+    if version is None:
+        cache.add(LIST_VERSION_KEY, _initial_version(), None)
+        version = cache.get(LIST_VERSION_KEY)
+    return version
+
+
+def _initial_version():
+    # Time-based so an evicted version key never resurrects stale pages
+    return int(time.time() * 1000)
+
+
+async def alist_cache_version():
+    version = await cache.aget(LIST_VERSION_KEY)
+    if version is None:
+        await cache.aadd(LIST_VERSION_KEY, _initial_version(), None)
+        version = await cache.aget(LIST_VERSION_KEY)
+    return version
+
+
+def bump_list_cache_version():
+    # Every cached list page embeds the version in its key, so bumping it
+    # retires them all at once
+    try:
+        cache.incr(LIST_VERSION_KEY)
+    except ValueError:
+        cache.add(LIST_VERSION_KEY, _initial_version(), None)
+
+
+def normalize_list_params(query_dict, filter_names):
+    # Same filters in a different order or with blanks share a cache entry
+    params = []
+    for name in sorted(filter_names):
+        values = sorted(v for v in query_dict.getlist(name) if v != "")
+        params.extend((name, value) for value in values)
+    return urlencode(params)
+
+
+def _params_digest(params):
+    return hashlib.md5(params.encode()).hexdigest()
+
+
+def _list_cache_prefix(params):
+    return f"restaurants:list:v{list_cache_version()}:{_params_digest(params)}"
+
+
+def list_page_cache_key(params, page):
+    return f"{_list_cache_prefix(params)}:{page}"
+
+
+async def _alist_cache_prefix(params):
+    return f"restaurants:list:v{await alist_cache_version()}:{_params_digest(params)}"
+
+
+async def alist_page_cache_key(params, page):
+    return f"{await _alist_cache_prefix(params)}:{page}"
+
+
+def get_cached_list_page(key):
+    return cache.get(key)
+
+
+def set_cached_list_page(key, ids, count):
+    cache.set(key, {"ids": ids, "count": count}, LIST_PAGE_TIMEOUT)
+
+
+def get_cached_list_count(params):
+    return cache.get(f"{_list_cache_prefix(params)}:count")
+
+
+def set_cached_list_count(params, count):
+    # Shared by every page of the same filter combination, so deep pages
+    # that are not cached yet still skip the COUNT(*)
+    cache.set(f"{_list_cache_prefix(params)}:count", count, LIST_PAGE_TIMEOUT)
+
+
+async def aget_cached_list_page(key):
+    return await cache.aget(key)
+
+
+async def aset_cached_list_page(key, ids, count):
+    await cache.aset(key, {"ids": ids, "count": count}, LIST_PAGE_TIMEOUT)
+
+
+async def aget_cached_list_count(params):
+    return await cache.aget(f"{await _alist_cache_prefix(params)}:count")
+
+
+async def aset_cached_list_count(params, count):
+    await cache.aset(f"{await _alist_cache_prefix(params)}:count", count, LIST_PAGE_TIMEOUT)
+
+def _card_fragment_keys(restaurants):
+    return {
+        make_template_fragment_key(CARD_FRAGMENT, [restaurant.pk, restaurant.fragment_version]): restaurant
+        for restaurant in restaurants
+    }
+
+
+def uncached_cards(restaurants):
+    # Restaurants whose card fragment will actually be rendered this request
+    keys = _card_fragment_keys(restaurants)
+    cached = cache.get_many(keys)
+    return [restaurant for key, restaurant in keys.items() if key not in cached]
+
+
+async def auncached_cards(restaurants):
+    keys = _card_fragment_keys(restaurants)
+    cached = await cache.aget_many(keys)
+    return [restaurant for key, restaurant in keys.items() if key not in cached]
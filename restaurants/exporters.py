@@ -0,0 +1,126 @@
+import csv
+import json
+from asgiref.sync import sync_to_async
+from collections import defaultdict
+from itertools import islice
+from datetime import datetime, time
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from .importers import LIST_SEPARATOR
+from .models import Bookmark, Food, Restaurant, Review, Visited
+
+# Catalog and activity export used by the export_catalog command and the
+# staff export endpoint. Rows are read with QuerySet.iterator() and encoded
+# one line at a time, so memory stays flat however large the table is.
+# Restaurant and dish rows use the columns import_catalog reads back.
+# Incremental exports (since=) carry inserts and updates only: deleted rows
+# leave no trace, so consumers needing deletions must diff full exports.
+
+CHUNK_SIZE = 2000
+FORMATS = ("jsonl", "csv")
+
+TIMESTAMPS = ("created_at", "updated_at")
+EXPORTS = {
+    "restaurants": (Restaurant, (
+        "id", "name", "city", "address", "cost_for_two", "opening_time", "closing_time",
+        "diet_type", "is_spotlight", "latitude", "longitude", "average_rating", "review_count",
+        "cuisines", *TIMESTAMPS,
+    )),
+    "foods": (Food, (
+        "id", "restaurant_id", "restaurant__name", "name", "price", "diet_type", "description",
+        "image", "cuisines", *TIMESTAMPS,
+    )),
+    "reviews": (Review, ("id", "restaurant_id", "user_id", "rating", "comment", *TIMESTAMPS)),
+    "bookmarks": (Bookmark, ("id", "restaurant_id", "user_id", *TIMESTAMPS)),
+    "visited": (Visited, ("id", "restaurant_id", "user_id", *TIMESTAMPS)),
+}
+# Output names that differ from the lookup
+COLUMN_NAMES = {"restaurant__name": "restaurant"}
+
+
+def columns(kind):
+    _, fields = EXPORTS[kind]
+    return [COLUMN_NAMES.get(field, field) for field in fields]
+
+
+def parse_since(value):
+    # An ISO date or datetime; naive values are in TIME_ZONE
+    since = parse_datetime(value)
+    if since is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"{value!r} is not an ISO date or datetime")
+        since = datetime.combine(day, time.min)
+    if settings.USE_TZ and timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    return since
+
+
+def export_queryset(kind, since=None):
+    model, fields = EXPORTS[kind]
+    queryset = model.objects.all()
+    if since is not None:
+        # Incremental: ordered so the last updated_at seen is the next watermark
+        return queryset.filter(updated_at__gte=since).order_by("updated_at", "pk")
+    return queryset.order_by("pk")
+
+
+def _cuisine_names(model, ids):
+    through = model.cuisines.through
+    owner = f"{model._meta.model_name}_id"
+    names = defaultdict(list)
+    for owner_id, name in through.objects.filter(**{f"{owner}__in": ids}).values_list(owner, "cuisine__name"):
+        names[owner_id].append(name)
+    return names
+
+
+def export_rows(kind, since=None, chunk_size=CHUNK_SIZE):
+    # Yields one dict per row; M2M cuisines are looked up once per chunk
+    model, fields = EXPORTS[kind]
+    with_cuisines = "cuisines" in fields
+    values = [field for field in fields if field != "cuisines"]
+    names = columns(kind)
+    rows = export_queryset(kind, since).values_list(*values).iterator(chunk_size=chunk_size)
+    while chunk := list(islice(rows, chunk_size)):
+        cuisines = _cuisine_names(model, [row[0] for row in chunk]) if with_cuisines else None
+        for row in chunk:
+            record = dict(zip(values, row))
+            if with_cuisines:
+                record["cuisines"] = sorted(cuisines.get(row[0], ()))
+            yield {name: record[field] for name, field in zip(names, fields)}
+
+
+class _Echo:
+    # csv.writer target that hands each encoded line back instead of buffering
+    def write(self, value):
+        return value
+
+
+def encode_rows(rows, kind, fmt="jsonl"):
+    if fmt == "csv":
+        writer = csv.writer(_Echo())
+        yield writer.writerow(columns(kind))
+        for row in rows:
+            if "cuisines" in row:
+                row["cuisines"] = LIST_SEPARATOR.join(row["cuisines"])
+            yield writer.writerow([
+                value.isoformat() if hasattr(value, "isoformat") else value for value in row.values()
+            ])
+    else:
+        for row in rows:
+            yield json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + "\n"
+
+
+def export_lines(kind, fmt="jsonl", since=None, chunk_size=CHUNK_SIZE):
+    return encode_rows(export_rows(kind, since, chunk_size), kind, fmt)
+
+
+async def aexport_lines(kind, fmt="jsonl", since=None, chunk_size=CHUNK_SIZE):
+    # ASGI buffers a sync iterator whole before sending it, so pull blocks of
+    # lines through sync_to_async instead, on the thread that holds the cursor
+    lines = export_lines(kind, fmt, since, chunk_size)
+    next_block = sync_to_async(lambda: "".join(islice(lines, chunk_size)))
+    while block := await next_block():
+        yield block
@@ -1,6 +1,11 @@
 import django_filters
 from django import forms
-from .models import Restaurant, DietType, Cuisine
+from .models import Restaurant, DietType, Cuisine, Food
+from .search import get_search_backend
+from .geo import MAX_RADIUS_KM
+from .hours import local_now, minute_of_day, open_at_q
+from .cache import bookmarked_restaurant_ids, visited_restaurant_ids
+from django.db.models import Exists, OuterRef
 class RestaurantFilter(django_filters.FilterSet):
 
     cost_for_two_min = django_filters.NumberFilter(field_name="cost_for_two", lookup_expr="gte")
@@ -8,10 +13,12 @@ class RestaurantFilter(django_filters.FilterSet):
 
     diet_type = django_filters.MultipleChoiceFilter(
         choices=DietType.choices,
+        distinct=False,  # plain column filter, no join to de-duplicate
         widget=forms.CheckboxSelectMultiple
     )
 
     cuisines = django_filters.ModelMultipleChoiceFilter(
+        method="filter_cuisines",
         queryset=Cuisine.objects.all(),
         widget=forms.CheckboxSelectMultiple
     )
@@ -19,6 +26,7 @@ class RestaurantFilter(django_filters.FilterSet):
     rating = django_filters.MultipleChoiceFilter(
         field_name="average_rating",
         choices=[(n, n) for n in range(1, 6)],  # 1 to 5 stars
+        distinct=False,
         lookup_expr="exact"
     )
 
@@ -42,15 +50,40 @@ class RestaurantFilter(django_filters.FilterSet):
         empty_label=None
     )
     
-    search = django_filters.CharFilter(field_name='name', lookup_expr='icontains', label='Search')
+    search = django_filters.CharFilter(method='filter_search', label='Search')
 
     bookmarked = django_filters.BooleanFilter(method="filter_bookmarked")
 
     visited = django_filters.BooleanFilter(method="filter_visited")
 
+    # Wall-clock times in TIME_ZONE; both handle hours past midnight
+    open_now = django_filters.BooleanFilter(method="filter_open_now")
+    open_at = django_filters.TimeFilter(method="filter_open_at")
+
+    # "lat,lng"; with radius_km lists everything within it, otherwise the
+    # NEAREST_K closest. Declared last so it sees every other filter.
+    near = django_filters.CharFilter(method="filter_near")
+    radius_km = django_filters.NumberFilter(method="filter_radius", min_value=0, max_value=MAX_RADIUS_KM)
+
+    NEAREST_K = 50
+
+    # Results of these depend on request.user, so list results using them can't be shared
+    user_specific_filters = ("bookmarked", "visited")
+    # ...and these on the time of the request
+    time_dependent_filters = ("open_now",)
+
     class Meta:
         model = Restaurant
-        fields = ['cost_for_two_min', 'cost_for_two_max', 'diet_type', 'cuisines', 'rating', 'is_spotlight', 'search', 'bookmarked', 'visited']
+        fields = ['cost_for_two_min', 'cost_for_two_max', 'diet_type', 'cuisines', 'rating', 'is_spotlight', 'search', 'bookmarked', 'visited', 'open_now', 'open_at', 'near', 'radius_km']
+
+    def is_shareable(self):
+        # Whether results may be cached and served to other users and later requests
+        private_filters = self.user_specific_filters + self.time_dependent_filters
+        return not any(self.data.get(name) for name in private_filters)
+
+    def active_filters(self):
+        # Names of the filters this request uses, in declaration order
+        return [name for name in self.filters if self.data.get(name) not in (None, "")]
 
     def sort_by_price(self, queryset, name, value):
         if value == "price_low":
@@ -66,12 +99,115 @@ class RestaurantFilter(django_filters.FilterSet):
             return queryset.order_by("average_rating")
         return queryset
 
+    def filter_search(self, queryset, name, value):
+        backend = get_search_backend()
+        queryset = backend.search(queryset, value)
+        # Rank by relevance unless the user picked an explicit sort
+        if backend.ranked and not (self.data.get('sort_by') or self.data.get('sort_by_rating')):
+            queryset = queryset.order_by('-search_rank', *queryset.query.order_by)
+        return queryset
+
+    def filter_cuisines(self, queryset, name, value):
+        if not value:
+            return queryset
+        # Semi-join on the M2M table: a restaurant matching several selected
+        # cuisines still appears once, without needing DISTINCT
+        restaurant_cuisines = Restaurant.cuisines.through.objects.filter(
+            restaurant=OuterRef('pk'),
+            cuisine__in=value,
+        )
+        return queryset.filter(Exists(restaurant_cuisines))
+
     def filter_bookmarked(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
-            return queryset.filter(bookmarked_by__user=self.request.user)
+            return queryset.filter(pk__in=bookmarked_restaurant_ids(self.request.user))
         return queryset
     
     def filter_visited(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
-            return queryset.filter(visited_by__user=self.request.user)
+            return queryset.filter(pk__in=visited_restaurant_ids(self.request.user))
+        return queryset
+
+    def filter_near(self, queryset, name, value):
+        try:
+            lat, lng = (float(part) for part in value.split(","))
+        except ValueError:
+            return queryset
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            return queryset
+
+        radius_km = self.form.cleaned_data.get("radius_km")
+        if radius_km:
+            queryset = queryset.within_radius(lat, lng, float(radius_km))
+        else:
+            queryset = queryset.nearest(lat, lng, self.NEAREST_K)
+        # Closest first unless the user picked an explicit sort
+        if not (self.data.get('sort_by') or self.data.get('sort_by_rating')):
+            queryset = queryset.order_by('distance_km', *queryset.query.order_by)
         return queryset
+
+    def filter_radius(self, queryset, name, value):
+        # Applied by filter_near
+        return queryset
+
+    def filter_open_now(self, queryset, name, value):
+        if value:
+            return queryset.filter(open_at_q(minute_of_day(local_now())))
+        return queryset
+
+    def filter_open_at(self, queryset, name, value):
+        return queryset.filter(open_at_q(minute_of_day(value)))
+
+class FoodFilter(django_filters.FilterSet):
+    # Dish search across every restaurant; see DishSearchView
+
+    q = django_filters.CharFilter(method='filter_search', label='Dish')
+
+    price_min = django_filters.NumberFilter(field_name="price", lookup_expr="gte")
+    price_max = django_filters.NumberFilter(field_name="price", lookup_expr="lte")
+
+    diet_type = django_filters.MultipleChoiceFilter(
+        choices=DietType.choices,
+        distinct=False,
+        widget=forms.CheckboxSelectMultiple
+    )
+
+    cuisines = django_filters.ModelMultipleChoiceFilter(
+        method="filter_cuisines",
+        queryset=Cuisine.objects.all(),
+        widget=forms.CheckboxSelectMultiple
+    )
+
+    sort_by = django_filters.ChoiceFilter(
+        method="sort_by_price",
+        choices=[
+            ('price_low', 'Low → High'),
+            ('price_high', 'High → Low'),
+        ],
+        empty_label=None
+    )
+
+    class Meta:
+        model = Food
+        fields = ['q', 'price_min', 'price_max', 'diet_type', 'cuisines', 'sort_by']
+
+    def sort_by_price(self, queryset, name, value):
+        if value == "price_high":
+            return queryset.order_by("-price", "-id")
+        return queryset.order_by("price", "id")
+
+    def filter_search(self, queryset, name, value):
+        backend = get_search_backend()
+        queryset = backend.search_foods(queryset, value)
+        if backend.ranked and not self.data.get('sort_by'):
+            queryset = queryset.order_by('-search_rank', *queryset.query.order_by)
+        return queryset
+
+    def filter_cuisines(self, queryset, name, value):
+        if not value:
+            return queryset
+        food_cuisines = Food.cuisines.through.objects.filter(
+            food=OuterRef('pk'),
+            cuisine__in=value,
+        )
+        return queryset.filter(Exists(food_cuisines))
@@ -0,0 +1,68 @@
+import math
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import ASin, Cos, Power, Radians, Sin, Sqrt
+
+# Restaurants are bucketed into a fixed lat/lng grid; geo_cell is the bucket
+# number. A radius search looks up the handful of cells covering the circle
+# through the (geo_cell, latitude, longitude) index instead of every row.
+CELL_DEGREES = 0.1  # ~11 km of latitude
+LNG_CELLS = round(360 / CELL_DEGREES)
+LAT_CELLS = round(180 / CELL_DEGREES)
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+MAX_RADIUS_KM = 100
+
+
+def _lat_index(lat):
+    return min(int((lat + 90) // CELL_DEGREES), LAT_CELLS - 1)
+
+
+def _lng_index(lng):
+    return int((lng + 180) // CELL_DEGREES) % LNG_CELLS
+
+
+def geo_cell(lat, lng):
+    if lat is None or lng is None:
+        return None
+    return _lat_index(lat) * LNG_CELLS + _lng_index(lng)
+
+
+def _lng_span(lat, lat_span, radius_km):
+    # Longitude degrees shrink towards the poles; use the widest latitude in range
+    widest = min(abs(lat) + lat_span, 90)
+    cos_lat = math.cos(math.radians(widest))
+    if cos_lat < 1e-6:
+        return 180
+    return min(radius_km / (KM_PER_DEGREE * cos_lat), 180)
+
+
+def bounding_box(lat, lng, radius_km):
+    lat_span = radius_km / KM_PER_DEGREE
+    return lat_span, _lng_span(lat, lat_span, radius_km)
+
+
+def covering_cell_ranges(lat, lng, radius_km):
+    # Cells of one grid row are numbered contiguously, so the box around the
+    # circle is one (first, last) geo_cell range per row, two if it wraps at 180°
+    lat_span, lng_span = bounding_box(lat, lng, radius_km)
+    rows = range(_lat_index(max(lat - lat_span, -90)), _lat_index(min(lat + lat_span, 90)) + 1)
+    if lng_span >= 180:
+        column_ranges = [(0, LNG_CELLS - 1)]
+    else:
+        first, last = _lng_index(lng - lng_span), _lng_index(lng + lng_span)
+        column_ranges = [(first, last)] if first <= last else [(first, LNG_CELLS - 1), (0, last)]
+    return [
+        (row * LNG_CELLS + first, row * LNG_CELLS + last)
+        for row in rows
+        for first, last in column_ranges
+    ]
+
+
+def distance_km(lat, lng):
+    # Haversine from (lat, lng) to each row, in SQL; Django supplies these
+    # functions on SQLite too
+    half_dlat = Radians(F('latitude') - Value(lat)) / 2
+    half_dlng = Radians(F('longitude') - Value(lng)) / 2
+    a = Power(Sin(half_dlat), 2) + Cos(Radians(F('latitude'))) * math.cos(math.radians(lat)) * Power(Sin(half_dlng), 2)
+    return ASin(Sqrt(a), output_field=FloatField()) * (2 * EARTH_RADIUS_KM)
+
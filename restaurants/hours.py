@@ -0,0 +1,42 @@
+from datetime import datetime
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_time
+
+# Opening hours as minute-of-day intervals [open_minute, close_minute).
+# Hours past midnight continue past MINUTES_PER_DAY (18:00-02:00 is
+# 1080-1560), so "open at m" is the same two range checks for every
+# restaurant: open at m today, or still open at m from yesterday's opening.
+MINUTES_PER_DAY = 24 * 60
+
+
+def minute_of_day(value):
+    if isinstance(value, str):
+        value = parse_time(value)
+    return value.hour * 60 + value.minute
+
+
+def opening_minutes(opening_time, closing_time):
+    if opening_time is None or closing_time is None:
+        return None, None
+    open_minute = minute_of_day(opening_time)
+    close_minute = minute_of_day(closing_time)
+    if close_minute <= open_minute:
+        # Closes after midnight; equal times mean open around the clock
+        close_minute += MINUTES_PER_DAY
+    return open_minute, close_minute
+
+
+def open_at_q(minute):
+    return (
+        Q(open_minute__lte=minute, close_minute__gt=minute)
+        | Q(open_minute__lte=minute + MINUTES_PER_DAY, close_minute__gt=minute + MINUTES_PER_DAY)
+    )
+
+
+def local_now():
+    # Opening times are wall-clock times in TIME_ZONE
+    if settings.USE_TZ:
+        return timezone.localtime()
+    return datetime.now()
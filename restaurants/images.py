@@ -0,0 +1,154 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import PurePosixPath
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from PIL import Image, ImageOps, JpegImagePlugin, UnidentifiedImageError, features
+
+logger = logging.getLogger(__name__)
+
+# Uploads are stored without EXIF/XMP (strip_metadata, before the first
+# save); what pages show are resized copies made after the upload commits:
+# each width step in every supported format. Names, widths and the
+# original's size end up in the image_variants/image_width/image_height
+# columns of the row.
+VARIANT_WIDTHS = (320, 640, 1280)
+# Best first; the order of <source> elements in responsive_image.html
+VARIANT_FORMATS = {
+    fmt: options
+    for fmt, options in (
+        ("avif", {"format": "AVIF", "quality": 55}),
+        ("webp", {"format": "WEBP", "quality": 78, "method": 4}),
+    )
+    if features.check(fmt)
+}
+MIME_TYPES = {"avif": "image/avif", "webp": "image/webp"}
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.RESTAURANT_IMAGE_WORKERS, thread_name_prefix="images")
+    return _executor
+
+
+def variant_widths(width):
+    # Never upscale: steps below the original, then the original capped at the largest step
+    return sorted({*(step for step in VARIANT_WIDTHS if step < width), min(width, VARIANT_WIDTHS[-1])})
+
+
+def _encode(image, fmt):
+    buffer = BytesIO()
+    image.save(buffer, **VARIANT_FORMATS[fmt])
+    return buffer.getvalue()
+
+
+def strip_metadata(upload):
+    # The upload re-encoded with its EXIF orientation applied and without
+    # EXIF/XMP (GPS position, camera serials), or None if it carries neither
+    # or isn't an image Pillow reads
+    try:
+        upload.seek(0)
+        with Image.open(upload) as original:
+            if not original.getexif() and "xmp" not in original.info:
+                return None
+            fmt = "JPEG" if original.format == "MPO" else original.format
+            options = {}
+            if fmt == "JPEG":
+                # Same quantization and subsampling, so no visible quality loss
+                options = {"qtables": original.quantization, "subsampling": JpegImagePlugin.get_sampling(original)}
+            if "icc_profile" in original.info:
+                options["icc_profile"] = original.info["icc_profile"]
+            image = ImageOps.exif_transpose(original)
+            image.info = {}
+            buffer = BytesIO()
+            image.save(buffer, fmt, **options)
+            return buffer.getvalue()
+    except (UnidentifiedImageError, OSError, ValueError):
+        return None
+    finally:
+        upload.seek(0)
+
+
+def build_variants(storage, name):
+    with storage.open(name) as f, Image.open(f) as original:
+        # Apply the EXIF orientation before dropping EXIF with the re-encode
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+        width, height = image.size
+
+        path = PurePosixPath(name)
+        variants = {"source": name}
+        for fmt in VARIANT_FORMATS:
+            variants[fmt] = {}
+            for step in variant_widths(width):
+                resized = image if step == width else image.resize(
+                    (step, max(1, round(height * step / width))), Image.Resampling.LANCZOS
+                )
+                variant = f"{path.parent}/variants/{path.stem}-{step}.{fmt}"
+                variants[fmt][str(step)] = storage.save(variant, ContentFile(_encode(resized, fmt)))
+    return width, height, variants
+
+
+def variant_names(variants):
+    return {name for fmt in VARIANT_FORMATS.keys() & variants.keys() for name in variants[fmt].values()}
+
+
+def delete_files(storage, names):
+    # Content-hashed storage keeps the ones other rows still refer to
+    for name in names:
+        storage.delete(name)
+
+
+def save_variants(model, pk, name, width, height, variants):
+    storage = model._meta.get_field("image").storage
+    rows = model.objects.filter(pk=pk, image=name)
+    # Only if the row still points at this upload
+    previous = rows.values_list("image_variants", flat=True).first()
+    if previous is None or not rows.update(image_width=width, image_height=height, image_variants=variants):
+        delete_files(storage, variant_names(variants))
+        return False
+    # Thumbnails of the image this one replaced, or of an earlier run
+    delete_files(storage, variant_names(previous) - variant_names(variants))
+    model.variants_ready([pk])
+    return True
+
+
+def process_image(model, pk, name):
+    # Identical uploads share a file under content-hashed storage; reuse
+    # thumbnails another row already has for it
+    done = model.objects.filter(image=name, image_variants__source=name).values_list(
+        "image_width", "image_height", "image_variants"
+    ).first()
+    if done is None:
+        done = build_variants(model._meta.get_field("image").storage, name)
+    return save_variants(model, pk, name, *done)
+
+
+def try_process_image(model, pk, name, in_worker=False):
+    try:
+        return process_image(model, pk, name)
+    except Exception:
+        logger.exception("Could not process %s for %s %s", name, model.__name__, pk)
+        return False
+    finally:
+        if in_worker:
+            # Worker threads get their own connections; don't leave them open
+            connections.close_all()
+
+
+def schedule_processing(instance):
+    model, pk, name = type(instance), instance.pk, instance.image.name
+
+    def submit():
+        if settings.RESTAURANT_IMAGE_WORKERS:
+            _get_executor().submit(try_process_image, model, pk, name, True)
+        else:
+            try_process_image(model, pk, name)
+
+    transaction.on_commit(submit)
@@ -0,0 +1,261 @@
+import csv
+import json
+import time
+from abc import ABC, abstractmethod
+from itertools import islice
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from .cache import bump_list_cache_version
+from .models import Cuisine, DietType, Food, Restaurant, RestaurantImage
+
+# Catalog import used by the import_catalog command. Rows are streamed from
+# CSV or JSON Lines and written in batches, one transaction per batch:
+# restaurants are upserted on their unique name, dishes are matched on
+# (restaurant, name), and cuisines are resolved from an in-memory name map.
+
+LIST_SEPARATOR = "|"
+DIET_TYPES = {label.lower(): value for value, label in DietType.choices}
+
+
+def read_rows(path, fmt=None):
+    fmt = fmt or ("jsonl" if str(path).endswith((".jsonl", ".ndjson")) else "csv")
+    with open(path, newline="", encoding="utf-8") as f:
+        if fmt == "jsonl":
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(f)
+
+
+def split_list(value):
+    # "Italian|Chinese" in CSV, a list in JSON; None when the column is absent
+    if value is None:
+        return None
+    if isinstance(value, list):
+        return [str(item).strip() for item in value if str(item).strip()]
+    return [item.strip() for item in str(value).split(LIST_SEPARATOR) if item.strip()]
+
+
+def clean(model, name, value):
+    field = model._meta.get_field(name)
+    if value is None or value == "":
+        if field.has_default():
+            return field.get_default()
+        if field.null:
+            return None
+        raise ValidationError(f"{name} is required")
+    return field.to_python(value)
+
+
+def parse_diet_type(value):
+    if value is None or value == "":
+        return DietType.VEG
+    text = str(value).strip().lower()
+    if text in DIET_TYPES:
+        return DIET_TYPES[text]
+    try:
+        return DietType(int(text))
+    except ValueError:
+        raise ValidationError(f"unknown diet_type {value!r}")
+
+
+class CuisineMap:
+    def __init__(self):
+        self.ids = dict(Cuisine.objects.values_list("name", "pk"))
+
+    def resolve(self, names):
+        missing = set(names) - self.ids.keys()
+        if missing:
+            Cuisine.objects.bulk_create([Cuisine(name=name) for name in missing], ignore_conflicts=True)
+            self.ids.update(Cuisine.objects.filter(name__in=missing).values_list("name", "pk"))
+        return self.ids
+
+
+class ImportStats:
+    def __init__(self, start_row=0):
+        self.start_row = start_row
+        self.rows = start_row
+        self.imported = 0
+        self.errors = []
+        self.started = time.perf_counter()
+
+    @property
+    def seconds(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def rows_per_second(self):
+        return (self.rows - self.start_row) / self.seconds if self.seconds else 0
+
+
+class CatalogImporter(ABC):
+    batch_size = 2000
+
+    def __init__(self, batch_size=None):
+        self.batch_size = batch_size or self.batch_size
+        self.cuisines = CuisineMap()
+
+    def run(self, rows, start_row=0, on_batch=None):
+        # Skips the first start_row rows, so an interrupted import can resume
+        stats = ImportStats(start_row)
+        rows = islice(rows, start_row, None)
+        while batch := list(islice(rows, self.batch_size)):
+            parsed = []
+            for number, row in enumerate(batch, stats.rows + 1):
+                try:
+                    parsed.append((number, *self.parse(row)))
+                except (ValidationError, ValueError, KeyError, TypeError) as e:
+                    stats.errors.append((number, self.describe_error(e)))
+            with transaction.atomic():
+                stats.imported += self.save_batch(parsed, stats)
+                # Per batch: a later failure leaves the earlier ones committed
+                transaction.on_commit(self.batch_committed)
+            stats.rows += len(batch)
+            if on_batch:
+                on_batch(stats)
+        return stats
+
+    def describe_error(self, error):
+        if isinstance(error, ValidationError):
+            return "; ".join(error.messages)
+        if isinstance(error, KeyError):
+            return f"missing column {error}"
+        return str(error)
+
+    @abstractmethod
+    def parse(self, row):
+        # A tuple of what save_batch() needs for one row; raises on bad input
+        ...
+
+    @abstractmethod
+    def save_batch(self, parsed, stats):
+        # Writes parsed rows and returns how many were imported
+        ...
+
+    def batch_committed(self):
+        pass
+
+    def set_cuisines(self, through, owner_field, owners):
+        # owners: {owner pk: [cuisine names] or None}; None leaves the links alone
+        owners = {pk: names for pk, names in owners.items() if names is not None}
+        if not owners:
+            return
+        ids = self.cuisines.resolve({name for names in owners.values() for name in names})
+        through.objects.filter(**{f"{owner_field}__in": owners}).delete()
+        through.objects.bulk_create(
+            [
+                through(**{f"{owner_field}_id": pk, "cuisine_id": ids[name]})
+                for pk, names in owners.items()
+                for name in set(names)
+            ],
+            ignore_conflicts=True,
+        )
+
+
+class RestaurantImporter(CatalogImporter):
+    fields = (
+        "city", "address", "cost_for_two", "opening_time", "closing_time",
+        "is_spotlight", "latitude", "longitude",
+    )
+    # Everything an import may overwrite; review counters and ratings stay as they are
+    update_fields = (
+        *fields, "diet_type", "geo_cell", "open_minute", "close_minute", "updated_at",
+    )
+
+    def parse(self, row):
+        restaurant = Restaurant(
+            name=clean(Restaurant, "name", row["name"]),
+            diet_type=parse_diet_type(row.get("diet_type")),
+        )
+        for name in self.fields:
+            setattr(restaurant, name, clean(Restaurant, name, row.get(name)))
+        restaurant.set_derived_fields()
+        return restaurant, split_list(row.get("cuisines")), split_list(row.get("images"))
+
+    def save_batch(self, parsed, stats):
+        # The last row wins when a name repeats within a batch
+        by_name = {restaurant.name: (restaurant, cuisines, images) for _, restaurant, cuisines, images in parsed}
+        if not by_name:
+            return 0
+        # RETURNING sets the pk of inserted and updated rows alike
+        created = Restaurant.objects.bulk_create(
+            [restaurant for restaurant, _, _ in by_name.values()],
+            update_conflicts=True,
+            unique_fields=["name"],
+            update_fields=self.update_fields,
+        )
+        ids = {restaurant.name: restaurant.pk for restaurant in created}
+
+        self.set_cuisines(
+            Restaurant.cuisines.through, "restaurant",
+            {ids[name]: cuisines for name, (_, cuisines, _) in by_name.items()},
+        )
+        self.add_images({ids[name]: images for name, (_, _, images) in by_name.items() if images})
+        return len(by_name)
+
+    def add_images(self, images):
+        # Paths of files already in MEDIA storage; ones already attached are skipped
+        if not images:
+            return
+        existing = set(
+            RestaurantImage.objects.filter(restaurant_id__in=images).values_list("restaurant_id", "image")
+        )
+        RestaurantImage.objects.bulk_create([
+            RestaurantImage(restaurant_id=pk, image=path)
+            for pk, paths in images.items()
+            for path in paths
+            if (pk, path) not in existing
+        ])
+
+    def batch_committed(self):
+        # bulk_create sends no signals; retire the cached list pages here
+        bump_list_cache_version()
+
+
+class FoodImporter(CatalogImporter):
+    fields = ("price", "description", "image")
+    update_fields = (*fields, "diet_type", "updated_at")
+
+    def parse(self, row):
+        food = Food(
+            name=clean(Food, "name", row["name"]),
+            diet_type=parse_diet_type(row.get("diet_type")),
+        )
+        for name in self.fields:
+            setattr(food, name, clean(Food, name, row.get(name)))
+        return clean(Restaurant, "name", row["restaurant"]), food, split_list(row.get("cuisines"))
+
+    def save_batch(self, parsed, stats):
+        restaurant_ids = dict(
+            Restaurant.objects.filter(name__in={name for _, name, _, _ in parsed}).values_list("name", "pk")
+        )
+        dishes = {}
+        for number, restaurant_name, food, cuisines in parsed:
+            if restaurant_name not in restaurant_ids:
+                stats.errors.append((number, f"unknown restaurant {restaurant_name!r}"))
+                continue
+            food.restaurant_id = restaurant_ids[restaurant_name]
+            dishes[food.restaurant_id, food.name] = (food, cuisines)
+        if not dishes:
+            return 0
+
+        existing = {
+            (restaurant_id, name): pk
+            for restaurant_id, name, pk in Food.objects.filter(
+                restaurant_id__in=restaurant_ids.values()
+            ).values_list("restaurant_id", "name", "pk")
+        }
+        for key, (food, _) in dishes.items():
+            food.pk = existing.get(key)
+        # Dishes that exist are upserted on their pk: one INSERT .. ON CONFLICT
+        # instead of bulk_update()'s CASE WHEN per field and row
+        Food.objects.bulk_create(
+            [food for food, _ in dishes.values()],
+            update_conflicts=True,
+            unique_fields=["id"],
+            update_fields=self.update_fields,
+        )
+
+        self.set_cuisines(Food.cuisines.through, "food", {food.pk: cuisines for food, cuisines in dishes.values()})
+        return len(dishes)
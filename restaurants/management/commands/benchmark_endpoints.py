@@ -0,0 +1,255 @@
+import json
+import math
+import random
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import urlopen
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+from restaurants.models import Cuisine, Restaurant
+from restaurants.test_restaurants.factories import (
+    CuisineFactory, bulk_attach_cuisines, bulk_create_foods, bulk_create_restaurants,
+    bulk_create_reviews, bulk_create_users, popularity_weights,
+)
+
+PREFIX = "Bench Restaurant"
+CUISINES = ("North Indian", "South Indian", "Chinese", "Italian", "Mexican", "Thai", "Desserts", "Cafe")
+# Each list request draws a random subset of these, so caches see a realistic spread
+LIST_FILTERS = {
+    "diet_type": lambda rng, ctx: rng.choice(["1", "2", "3"]),
+    "cost_for_two_max": lambda rng, ctx: str(rng.randrange(300, 3000, 100)),
+    "rating": lambda rng, ctx: rng.choice(["3", "4"]),
+    "is_spotlight": lambda rng, ctx: "true",
+    "cuisines": lambda rng, ctx: str(rng.choice(ctx["cuisine_ids"])),
+    "search": lambda rng, ctx: rng.choice(["Bench", "Restaurant 1", "spice"]),
+    "sort_by": lambda rng, ctx: rng.choice(["price_low", "price_high"]),
+    "sort_by_rating": lambda rng, ctx: rng.choice(["rating_high", "rating_low"]),
+    "open_now": lambda rng, ctx: "true",
+    "near": lambda rng, ctx: f"{rng.uniform(8, 35):.4f},{rng.uniform(68, 97):.4f}",
+}
+SERVER_TIMING_QUERIES = re.compile(r'db;[^,]*desc="(\d+) queries"')
+# A scenario regresses when p95 latency or throughput is this much worse than
+# the baseline, or when it runs more queries per request than the baseline did
+DEFAULT_THRESHOLD = 0.25
+
+
+def percentile(sorted_values, fraction):
+    # Nearest-rank
+    return sorted_values[max(math.ceil(len(sorted_values) * fraction) - 1, 0)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a large skewed dataset with the test factories (rolled back afterwards unless --keep), "
+        "drive the list, detail, menu, review and toggle endpoints, and report p50/p95/p99 latency, "
+        "queries per request and throughput; optionally compare against a stored baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--restaurants", type=int, default=100_000)
+        parser.add_argument("--foods", type=int, default=1_000_000)
+        parser.add_argument("--reviews", type=int, default=5_000_000)
+        parser.add_argument("--users", type=int, default=50_000)
+        parser.add_argument("--requests", type=int, default=200, help="Requests per scenario.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--keep", action="store_true", help="Commit the seeded data instead of rolling it back.")
+        parser.add_argument(
+            "--url",
+            help="Load-test a running server at this base URL with the data already in the database "
+                 "(no seeding; GET scenarios only; queries come from its Server-Timing header).",
+        )
+        parser.add_argument("--concurrency", type=int, default=8, help="Parallel requests with --url.")
+        parser.add_argument("--baseline", help="JSON file of an earlier run to compare against.")
+        parser.add_argument("--save-baseline", help="Write this run's results to a JSON file.")
+        parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options["seed"])
+        if options["url"]:
+            results = self.run_http(options)
+        else:
+            results = self.run_in_process(options)
+
+        self.report(results)
+        if options["save_baseline"]:
+            Path(options["save_baseline"]).write_text(json.dumps({"scenarios": results}, indent=2))
+            self.stdout.write(f"Baseline written to {options['save_baseline']}")
+        if options["baseline"]:
+            self.compare(results, json.loads(Path(options["baseline"]).read_text())["scenarios"], options["threshold"])
+
+    # Dataset
+
+    def seed(self, options):
+        seed = options["seed"]
+        start = time.perf_counter()
+        self.stdout.write(
+            f"Seeding {options['restaurants']} restaurants, {options['foods']} foods, "
+            f"{options['reviews']} reviews from {options['users']} users..."
+        )
+        cuisine_ids = [CuisineFactory(name=f"Bench {name}").pk for name in CUISINES]
+        bulk_create_restaurants(options["restaurants"], seed=seed, prefix=PREFIX)
+        restaurant_ids = list(
+            Restaurant.objects.filter(name__startswith=PREFIX).order_by("pk").values_list("pk", flat=True)
+        )
+        bulk_attach_cuisines(restaurant_ids, cuisine_ids, seed=seed)
+        bulk_create_foods(restaurant_ids, options["foods"], seed=seed)
+        user_ids = bulk_create_users(options["users"])
+        # Popularity rank follows creation order: the first restaurants get most reviews and traffic
+        popularity = popularity_weights(len(restaurant_ids))
+        reviews = bulk_create_reviews(restaurant_ids, user_ids, options["reviews"], popularity, seed=seed)
+        self.stdout.write(f"Created {reviews} reviews ({options['reviews'] - reviews} repeated pairs skipped)")
+        call_command("rebuild_rating_counters", stdout=self.stdout)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        self.stdout.write(f"Seeded in {time.perf_counter() - start:.1f}s")
+        return {"restaurant_ids": restaurant_ids, "popularity": popularity, "cuisine_ids": cuisine_ids}
+
+    def existing_dataset(self):
+        restaurant_ids = list(Restaurant.objects.order_by("pk").values_list("pk", flat=True))
+        if not restaurant_ids:
+            raise CommandError("No restaurants found; seed the database first (e.g. with --keep).")
+        return {
+            "restaurant_ids": restaurant_ids,
+            "popularity": popularity_weights(len(restaurant_ids)),
+            "cuisine_ids": list(Cuisine.objects.values_list("pk", flat=True)) or [0],
+        }
+
+    # Scenarios: each returns (method, url, POST data)
+
+    def popular_restaurant(self, ctx):
+        return self.rng.choices(ctx["restaurant_ids"], cum_weights=ctx["popularity"])[0]
+
+    def list_request(self, ctx):
+        names = self.rng.sample(sorted(LIST_FILTERS), self.rng.randint(0, 3))
+        query = {name: LIST_FILTERS[name](self.rng, ctx) for name in names}
+        # Deeper pages of the unfiltered list; filtered results may not have them
+        if not query and self.rng.random() < 0.5:
+            query["page"] = str(self.rng.randint(2, 5))
+        url = reverse("restaurants:restaurant_list")
+        return "GET", url + ("?" + urlencode(query) if query else ""), None
+
+    def scenarios(self, writes):
+        scenarios = {
+            "list": self.list_request,
+            "detail": lambda ctx: ("GET", reverse("restaurants:restaurant_detail", args=[self.popular_restaurant(ctx)]), None),
+            "menu": lambda ctx: ("GET", reverse("restaurants:restaurant_foods", args=[self.popular_restaurant(ctx)]), None),
+            "reviews": lambda ctx: ("GET", reverse("restaurants:review_list", args=[self.popular_restaurant(ctx)]), None),
+        }
+        if writes:
+            toggle_urls = [reverse("restaurants:toggle_bookmark"), reverse("restaurants:toggle_visited")]
+            scenarios["toggle"] = lambda ctx: (
+                "POST", self.rng.choice(toggle_urls), {"restaurant_id": self.popular_restaurant(ctx)}
+            )
+        return scenarios
+
+    # Drivers
+
+    def run_in_process(self, options):
+        # The test client shares this thread's connection, so it sees the
+        # uncommitted dataset; requests therefore run one at a time
+        with transaction.atomic():
+            ctx = self.seed(options)
+            user = User.objects.create(username="bench_driver")
+            client = Client()
+            client.force_login(user)
+            results = {}
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+                for name, build in self.scenarios(writes=True).items():
+                    requests = [build(ctx) for _ in range(options["requests"])]
+                    results[name] = self.measure(requests, lambda request: self.client_request(client, *request), 1)
+            if not options["keep"]:
+                transaction.set_rollback(True)
+        return results
+
+    def client_request(self, client, method, url, data):
+        start = time.perf_counter()
+        if method == "POST":
+            response = client.post(url, data, secure=True)
+        else:
+            response = client.get(url, secure=True)
+        elapsed = time.perf_counter() - start
+        if response.status_code != 200:
+            raise CommandError(f"{method} {url} returned {response.status_code}")
+        return elapsed, response.request_stats.queries
+
+    def run_http(self, options):
+        ctx = self.existing_dataset()
+        base = options["url"].rstrip("/")
+        results = {}
+        for name, build in self.scenarios(writes=False).items():
+            requests = [build(ctx) for _ in range(options["requests"])]
+            results[name] = self.measure(requests, lambda request: self.http_request(base, *request), options["concurrency"])
+        connections.close_all()
+        return results
+
+    def http_request(self, base, method, url, data):
+        start = time.perf_counter()
+        try:
+            with urlopen(base + url, timeout=30) as response:
+                response.read()
+                timing = response.headers.get("Server-Timing", "")
+        except HTTPError as e:
+            raise CommandError(f"GET {url} returned {e.code}")
+        except URLError as e:
+            raise CommandError(f"GET {url} failed: {e.reason}")
+        elapsed = time.perf_counter() - start
+        match = SERVER_TIMING_QUERIES.search(timing)
+        return elapsed, int(match[1]) if match else None
+
+    def measure(self, requests, send, concurrency):
+        start = time.perf_counter()
+        if concurrency > 1:
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                samples = list(pool.map(send, requests))
+        else:
+            samples = [send(request) for request in requests]
+        elapsed = time.perf_counter() - start
+
+        latencies = sorted(seconds * 1000 for seconds, _ in samples)
+        queries = [count for _, count in samples if count is not None]
+        return {
+            "requests": len(samples),
+            "p50_ms": percentile(latencies, 0.50),
+            "p95_ms": percentile(latencies, 0.95),
+            "p99_ms": percentile(latencies, 0.99),
+            "queries": sum(queries) / len(queries) if queries else None,
+            "rps": len(samples) / elapsed,
+        }
+
+    # Output
+
+    def report(self, results):
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"\n{'scenario':<10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>8} {'req/s':>9}"
+        ))
+        for name, result in results.items():
+            queries = "-" if result["queries"] is None else f"{result['queries']:.1f}"
+            self.stdout.write(
+                f"{name:<10} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f} "
+                f"{queries:>8} {result['rps']:>9.1f}"
+            )
+
+    def compare(self, results, baseline, threshold):
+        regressions = []
+        for name, result in results.items():
+            before = baseline.get(name)
+            if before is None:
+                continue
+            if result["p95_ms"] > before["p95_ms"] * (1 + threshold):
+                regressions.append(f"{name}: p95 {before['p95_ms']:.2f} -> {result['p95_ms']:.2f} ms")
+            if result["rps"] < before["rps"] * (1 - threshold):
+                regressions.append(f"{name}: throughput {before['rps']:.1f} -> {result['rps']:.1f} req/s")
+            if None not in (result["queries"], before["queries"]) and result["queries"] > before["queries"] + 0.5:
+                regressions.append(f"{name}: queries/request {before['queries']:.1f} -> {result['queries']:.1f}")
+        if regressions:
+            raise CommandError("Regressions against the baseline:\n  " + "\n  ".join(regressions))
+        self.stdout.write(self.style.SUCCESS(f"No regressions beyond {threshold:.0%} against the baseline"))
@@ -0,0 +1,76 @@
+import random
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from restaurants.geo import MAX_RADIUS_KM, distance_km
+from restaurants.models import Restaurant
+from restaurants.test_restaurants.factories import bulk_create_restaurants
+
+RADII_KM = (2, 10, 50)
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed restaurants inside a rolled-back transaction and compare radius and "
+        "nearest-k searches through the geo_cell index against a full-table distance scan."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--restaurants", type=int, default=1_000_000)
+        parser.add_argument("--points", type=int, default=20, help="Random search points per query shape.")
+        parser.add_argument("--limit", type=int, default=10)
+
+    def handle(self, *args, **options):
+        rng = random.Random(1)
+        # Same region bulk_create_restaurants seeds into
+        points = [(rng.uniform(8, 35), rng.uniform(68, 97)) for _ in range(options["points"])]
+        limit = options["limit"]
+
+        with transaction.atomic():
+            self.stdout.write(f"Seeding {options['restaurants']} restaurants...")
+            bulk_create_restaurants(options["restaurants"])
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+
+            rows = []
+            for radius_km in RADII_KM:
+                name = f"radius {radius_km} km"
+                indexed = lambda lat, lng: Restaurant.objects.within_radius(lat, lng, radius_km)
+                scan = lambda lat, lng: self.full_scan(lat, lng).filter(distance_km__lte=radius_km)
+                rows.append((name, *self.compare(name, indexed, scan, points, limit)))
+
+            name = f"nearest {limit}"
+            indexed = lambda lat, lng: Restaurant.objects.nearest(lat, lng, limit)
+            # nearest() never looks further than MAX_RADIUS_KM
+            scan = lambda lat, lng: self.full_scan(lat, lng).filter(distance_km__lte=MAX_RADIUS_KM)
+            rows.append((name, *self.compare(name, indexed, scan, points, limit)))
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.MIGRATE_HEADING("\nSummary (ms per query, full scan -> geo_cell index)"))
+        for name, scan_ms, indexed_ms in rows:
+            self.stdout.write(f"{name:<16} {scan_ms:>10.2f} -> {indexed_ms:>10.2f}")
+
+    def full_scan(self, lat, lng):
+        return Restaurant.objects.annotate(distance_km=distance_km(lat, lng))
+
+    def compare(self, name, indexed, scan, points, limit):
+        self.stdout.write(self.style.SQL_KEYWORD(f"\n[{name}]"))
+        lat, lng = points[0]
+        self.stdout.write(indexed(lat, lng).order_by("distance_km")[:limit].explain())
+
+        timings = []
+        results = []
+        for build in (scan, indexed):
+            start = time.perf_counter()
+            found = [
+                list(build(lat, lng).order_by("distance_km", "id").values_list("pk", flat=True)[:limit])
+                for lat, lng in points
+            ]
+            timings.append((time.perf_counter() - start) * 1000 / len(points))
+            results.append(found)
+
+        if results[0] != results[1]:
+            raise CommandError(f"[{name}] index results differ from the full scan")
+        self.stdout.write(f"full scan {timings[0]:.2f} ms, geo_cell index {timings[1]:.2f} ms")
+        return timings
@@ -0,0 +1,97 @@
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+from restaurants.models import Restaurant
+
+ASYNC_URLCONF = "restaurants.test_restaurants.async_urls"
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare throughput of the sync views under the WSGI handler with the async "
+        "views under the ASGI handler, in-process, against the current database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint and mode.")
+        parser.add_argument("--concurrency", type=int, default=10)
+
+    def handle(self, *args, **options):
+        restaurant = Restaurant.objects.order_by("pk").first()
+        if restaurant is None:
+            raise CommandError("No restaurants found; load some data first (e.g. loaddata sample_data).")
+
+        self.total = options["requests"]
+        self.concurrency = options["concurrency"]
+        endpoints = {
+            "list": ("restaurants:restaurant_list", {}),
+            "detail": ("restaurants:restaurant_detail", {"pk": restaurant.pk}),
+            "menu": ("restaurants:restaurant_foods", {"restaurant_id": restaurant.pk}),
+        }
+
+        # The test clients always send Host: testserver
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+            self.run_endpoints(endpoints)
+
+    def run_endpoints(self, endpoints):
+        self.stdout.write(f"{'endpoint':<8} {'mode':<5} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9}")
+        for name, (url_name, kwargs) in endpoints.items():
+            wsgi = self.run_wsgi(reverse(url_name, kwargs=kwargs))
+            with override_settings(ROOT_URLCONF=ASYNC_URLCONF):
+                asgi = asyncio.run(self.run_asgi(reverse(url_name, kwargs=kwargs)))
+            for mode, result in (("wsgi", wsgi), ("asgi", asgi)):
+                self.report(name, mode, *result)
+
+    def run_wsgi(self, url):
+        def worker(count):
+            client = Client()
+            latencies = []
+            for _ in range(count):
+                start = time.perf_counter()
+                response = client.get(url, secure=True)
+                latencies.append(time.perf_counter() - start)
+                self.check_response(response, url)
+            connections.close_all()
+            return latencies
+
+        counts = self.split(self.total, self.concurrency)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            latencies = [lat for batch in pool.map(worker, counts) for lat in batch]
+        return latencies, time.perf_counter() - start
+
+    async def run_asgi(self, url):
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def one():
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.get(url, secure=True)
+                self.check_response(response, url)
+                return time.perf_counter() - start
+
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(one() for _ in range(self.total)))
+        return list(latencies), time.perf_counter() - start
+
+    def check_response(self, response, url):
+        if response.status_code != 200:
+            raise CommandError(f"{url} returned {response.status_code}")
+
+    def split(self, total, parts):
+        return [total // parts + (1 if i < total % parts else 0) for i in range(parts)]
+
+    def report(self, endpoint, mode, latencies, elapsed):
+        latencies_ms = sorted(lat * 1000 for lat in latencies)
+        p95 = latencies_ms[int(len(latencies_ms) * 0.95) - 1]
+        self.stdout.write(
+            f"{endpoint:<8} {mode:<5} {len(latencies) / elapsed:>9.1f} "
+            f"{statistics.median(latencies_ms):>9.2f} {p95:>9.2f}"
+        )
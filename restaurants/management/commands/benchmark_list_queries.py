@@ -0,0 +1,74 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.http import QueryDict
+from restaurants.filters import RestaurantFilter
+from restaurants.models import Restaurant
+from restaurants.test_restaurants.factories import bulk_create_restaurants
+
+# Filter/sort combinations the list page actually issues
+QUERY_SHAPES = {
+    "default": "",
+    "spotlight": "is_spotlight=true",
+    "diet_and_price": "diet_type=1&cost_for_two_min=200&cost_for_two_max=800",
+    "price_low_to_high": "sort_by=price_low",
+    "rating_4": "rating=4",
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed restaurants inside a rolled-back transaction and compare EXPLAIN "
+        "plans and timings of the list page queries with and without the Restaurant indexes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--restaurants", type=int, default=100_000)
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--page-size", type=int, default=10)
+
+    def handle(self, *args, **options):
+        # Everything, including the dropped indexes, is rolled back at the end
+        with transaction.atomic():
+            self.stdout.write(f"Seeding {options['restaurants']} restaurants...")
+            bulk_create_restaurants(options["restaurants"])
+            self.analyze()
+
+            self.stdout.write(self.style.MIGRATE_HEADING("\nWith indexes"))
+            after = self.run_shapes(options["repeat"], options["page_size"])
+
+            self.drop_indexes()
+            self.analyze()
+            self.stdout.write(self.style.MIGRATE_HEADING("\nWithout indexes"))
+            before = self.run_shapes(options["repeat"], options["page_size"])
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.MIGRATE_HEADING("\nSummary (ms per page query)"))
+        for name in QUERY_SHAPES:
+            self.stdout.write(f"{name:<20} {before[name]:>10.2f} -> {after[name]:>10.2f}")
+
+    def analyze(self):
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def drop_indexes(self):
+        with connection.cursor() as cursor:
+            for index in Restaurant._meta.indexes:
+                cursor.execute(f"DROP INDEX {connection.ops.quote_name(index.name)}")
+
+    def run_shapes(self, repeat, page_size):
+        timings = {}
+        for name, params in QUERY_SHAPES.items():
+            queryset = Restaurant.objects.order_by("-average_rating")
+            page = RestaurantFilter(data=QueryDict(params), queryset=queryset).qs[:page_size]
+
+            self.stdout.write(self.style.SQL_KEYWORD(f"\n[{name}] {params or '(no filters)'}"))
+            self.stdout.write(page.explain())
+
+            start = time.perf_counter()
+            for _ in range(repeat):
+                list(page.all())
+            timings[name] = (time.perf_counter() - start) * 1000 / repeat
+            self.stdout.write(f"{timings[name]:.2f} ms")
+        return timings
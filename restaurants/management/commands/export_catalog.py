@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+from restaurants.exporters import CHUNK_SIZE, EXPORTS, FORMATS, export_lines, parse_since
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream restaurants, dishes, reviews, bookmarks or visits as JSON Lines or CSV. "
+        "--since limits the export to rows updated at or after an ISO date or datetime; "
+        "rows deleted since then are not reported, so compare full exports to find deletions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=EXPORTS)
+        parser.add_argument("--format", choices=FORMATS, default="jsonl")
+        parser.add_argument(
+            "--since",
+            help="Only rows with updated_at at or after this ISO date/datetime (deletions are not exported).",
+        )
+        parser.add_argument("--output", help="File to write; defaults to stdout.")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            since = parse_since(options["since"]) if options["since"] else None
+        except ValueError as e:
+            raise CommandError(e)
+
+        lines = export_lines(options["kind"], options["format"], since, options["chunk_size"])
+        if options["output"]:
+            with open(options["output"], "w", newline="", encoding="utf-8") as f:
+                count = self.write_lines(f.write, lines)
+        else:
+            count = self.write_lines(lambda line: self.stdout.write(line, ending=""), lines)
+
+        if options["format"] == "csv":
+            count -= 1  # header
+        # stdout may be the export itself
+        self.stderr.write(f"Exported {count} {options['kind']}", style_func=self.style.SUCCESS)
+
+    def write_lines(self, write, lines):
+        count = 0
+        for line in lines:
+            write(line)
+            count += 1
+        return count
@@ -0,0 +1,55 @@
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from restaurants.importers import FoodImporter, RestaurantImporter, read_rows
+
+IMPORTERS = {
+    "restaurants": RestaurantImporter,
+    "foods": FoodImporter,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream restaurants or dishes from a CSV or JSON Lines file into the catalog "
+        "in batches. Multi-value columns (cuisines, images) are '|'-separated in CSV."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--kind", choices=IMPORTERS, default="restaurants")
+        parser.add_argument("--format", choices=["csv", "jsonl"], help="Defaults to the file extension.")
+        parser.add_argument("--batch-size", type=int, default=2000)
+        parser.add_argument(
+            "--resume", action="store_true",
+            help="Continue after the last committed batch of a previous run of this file.",
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options["path"])
+        if not path.exists():
+            raise CommandError(f"{path} does not exist")
+        # Written after every committed batch and removed once the file is done
+        checkpoint = path.with_name(path.name + ".progress")
+
+        start_row = 0
+        if options["resume"] and checkpoint.exists():
+            start_row = int(checkpoint.read_text())
+            self.stdout.write(f"Resuming after row {start_row}")
+
+        def on_batch(stats):
+            checkpoint.write_text(str(stats.rows))
+            if options["verbosity"] > 1:
+                self.stdout.write(f"{stats.rows} rows, {stats.rows_per_second:.0f} rows/s")
+
+        importer = IMPORTERS[options["kind"]](batch_size=options["batch_size"])
+        stats = importer.run(read_rows(path, options["format"]), start_row=start_row, on_batch=on_batch)
+        checkpoint.unlink(missing_ok=True)
+
+        for number, message in stats.errors[:20]:
+            self.stderr.write(f"row {number}: {message}")
+        if len(stats.errors) > 20:
+            self.stderr.write(f"... and {len(stats.errors) - 20} more errors")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {stats.imported} {options['kind']} from {stats.rows - start_row} rows "
+            f"in {stats.seconds:.1f}s ({stats.rows_per_second:.0f} rows/s), {len(stats.errors)} errors"
+        ))
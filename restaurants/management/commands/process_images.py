@@ -0,0 +1,39 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from restaurants.images import build_variants, save_variants
+from restaurants.models import Food, RestaurantImage
+
+logger = logging.getLogger("restaurants.images")
+
+
+class Command(BaseCommand):
+    help = (
+        "Build thumbnails for uploaded restaurant and dish images that don't have them yet, "
+        "e.g. after import_catalog, which skips the upload signals."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Rebuild existing thumbnails too.")
+        parser.add_argument("--workers", type=int, default=max(settings.RESTAURANT_IMAGE_WORKERS, 1))
+
+    def handle(self, *args, **options):
+        # Workers only resize and encode; rows are updated from this thread
+        with ThreadPoolExecutor(max_workers=options["workers"], thread_name_prefix="images") as pool:
+            for model in (RestaurantImage, Food):
+                storage = model._meta.get_field("image").storage
+                rows = model.objects.exclude(image="").exclude(image__isnull=True).order_by("pk")
+                jobs = [
+                    (pk, name)
+                    for pk, name, variants in rows.values_list("pk", "image", "image_variants").iterator()
+                    if options["all"] or variants.get("source") != name
+                ]
+                futures = [pool.submit(build_variants, storage, name) for _, name in jobs]
+                done = 0
+                for (pk, name), future in zip(jobs, futures):
+                    try:
+                        done += save_variants(model, pk, name, *future.result())
+                    except Exception:
+                        logger.exception("Could not process %s for %s %s", name, model.__name__, pk)
+                self.stdout.write(f"{model.__name__}: {done} of {len(jobs)} images processed")
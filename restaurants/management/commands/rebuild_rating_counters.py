@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from restaurants.cache import bump_list_cache_version
+from restaurants.models import Restaurant, Review
+
+COUNTER_FIELDS = [
+    "review_count",
+    "rating_sum",
+    "rating_1_count",
+    "rating_2_count",
+    "rating_3_count",
+    "rating_4_count",
+    "rating_5_count",
+]
+# review_version retires the cached card/detail fragments of every restaurant
+UPDATE_FIELDS = COUNTER_FIELDS + ["average_rating", "review_version"]
+
+
+class Command(BaseCommand):
+    help = "Recompute every restaurant's denormalized review counters from the reviews table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        star_counts = {
+            f"rating_{star}_count": Count("id", filter=Q(rating=star))
+            for star in range(1, 6)
+        }
+        stats = {
+            row.pop("restaurant"): row
+            for row in Review.objects.values("restaurant").annotate(
+                review_count=Count("id"),
+                rating_sum=Sum("rating"),
+                **star_counts,
+            ).order_by()
+        }
+
+        updated = 0
+        batch = []
+        with transaction.atomic():
+            for restaurant in Restaurant.objects.only("id").iterator(chunk_size=batch_size):
+                counters = stats.get(restaurant.pk, {})
+                for field in COUNTER_FIELDS:
+                    setattr(restaurant, field, counters.get(field) or 0)
+                restaurant.average_rating = Restaurant.calculate_average_rating(
+                    restaurant.review_count, restaurant.rating_sum
+                )
+                restaurant.review_version = F("review_version") + 1
+                batch.append(restaurant)
+
+                if len(batch) >= batch_size:
+                    Restaurant.objects.bulk_update(batch, UPDATE_FIELDS)
+                    updated += len(batch)
+                    batch = []
+
+            if batch:
+                Restaurant.objects.bulk_update(batch, UPDATE_FIELDS)
+                updated += len(batch)
+
+            # Cached list pages show the counters too
+            transaction.on_commit(bump_list_cache_version)
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rating counters for {updated} restaurants."))
@@ -1,31 +1,78 @@
-from django.db import models
-from django.db.models import Exists, OuterRef, Value, BooleanField 
+from functools import partial
+from django.db import models, transaction
+from django.db.models import Exists, OuterRef, Prefetch, Q
+
+def cover_images_prefetch():
+    from .models import RestaurantImage
+    # A plain prefetch_related('images') is bypassed by images.first()
+    # in templates; to_attr gives Restaurant.cover_image a list to read.
+    return Prefetch('images', queryset=RestaurantImage.objects.order_by('pk'), to_attr='prefetched_images')
+
 
 class RestaurantQuerySet(models.QuerySet):
-    def with_user_bookmarks(self, user):
-        from .models import Bookmark
-        if user.is_authenticated:
-            user_bookmarks = Bookmark.objects.filter(
-                user=user,
-                restaurant=OuterRef('pk')
-            )
-            return self.annotate(
-                is_bookmarked=Exists(user_bookmarks)
-            )
-        return self.annotate(
-            is_bookmarked=Value(False, output_field=BooleanField()))
-    
-    def with_user_visited(self, user):
-        from .models import Visited
-        if user.is_authenticated:
-            return self.annotate(
-                is_visited=Exists(
-                    Visited.objects.filter(
-                        user=user,
-                        restaurant=OuterRef('pk')
-                    )
-                )
-            )
-        return self.annotate(
-            is_visited=Value(False, output_field=BooleanField())
+    def within_radius(self, lat, lng, radius_km):
+        from .geo import bounding_box, covering_cell_ranges, distance_km
+        # The geo_cell ranges and latitude bounds narrow the rows through
+        # restaurant_geo_idx; the exact distance is only computed for those
+        in_cells = Q()
+        for first, last in covering_cell_ranges(lat, lng, radius_km):
+            in_cells |= Q(geo_cell__range=(first, last))
+        lat_span, _ = bounding_box(lat, lng, radius_km)
+        return self.filter(
+            in_cells,
+            latitude__range=(lat - lat_span, lat + lat_span),
+        ).annotate(distance_km=distance_km(lat, lng)).filter(distance_km__lte=radius_km)
+
+    def nearest(self, lat, lng, k, start_radius_km=2):
+        from .geo import MAX_RADIUS_KM
+        # The k closest restaurants (fewer past MAX_RADIUS_KM). Each step
+        # reads the IDs of up to k nearest inside a growing radius; once it
+        # finds k, nothing outside the radius can be closer than them. The
+        # result keeps the caller's ordering, so a chosen sort still applies.
+        radius_km = start_radius_km
+        while True:
+            radius_km = min(radius_km, MAX_RADIUS_KM)
+            within = self.within_radius(lat, lng, radius_km)
+            nearest_ids = list(within.order_by('distance_km', 'pk').values_list('pk', flat=True)[:k])
+            if len(nearest_ids) >= k or radius_km >= MAX_RADIUS_KM:
+                return within.filter(pk__in=nearest_ids)
+            radius_km *= 2
+
+
+class UserRestaurantQuerySet(models.QuerySet):
+    # Shared by Bookmark and Visited. The user's cached ID set is dropped
+    # once the write commits, so no request re-caches the old set meanwhile.
+    def add_for(self, user, restaurant_ids):
+        self.bulk_create(
+            [self.model(user=user, restaurant_id=pk) for pk in restaurant_ids],
+            ignore_conflicts=True,  # INSERT ... ON CONFLICT DO NOTHING
+        )
+        transaction.on_commit(partial(self.model.invalidate_user_cache, user.pk))
+
+    def remove_for(self, user, restaurant_ids):
+        # The post_delete receivers in signals.py drop the cached set
+        deleted, _ = self.filter(user=user, restaurant_id__in=restaurant_ids).delete()
+        return deleted
+
+    def toggle(self, user, restaurant_id):
+        # Returns the new state; at most one DELETE and one INSERT
+        if self.remove_for(user, [restaurant_id]):
+            return False
+        self.add_for(user, [restaurant_id])
+        return True
+
+class FoodQuerySet(models.QuerySet):
+    def menu_for(self, restaurant, cuisine_id=None):
+        # Ordered to match the (restaurant, diet_type, name, id) index, so a
+        # page of a long menu is an index range scan and not a full sort
+        from .models import Food
+        foods = (
+            self.filter(restaurant=restaurant)
+            .select_related('restaurant')
+            .prefetch_related('cuisines')
+            .order_by('diet_type', 'name', 'id')
         )
+        if cuisine_id:
+            food_cuisines = Food.cuisines.through.objects.filter(food=OuterRef('pk'), cuisine_id=cuisine_id)
+            foods = foods.filter(Exists(food_cuisines))
+        return foods
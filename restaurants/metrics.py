@@ -0,0 +1,19 @@
+from homebite.metrics import Counter
+
+FILTER_COMBINATIONS = Counter(
+    "restaurant_list_filters_total",
+    "Restaurant list requests by the combination of RestaurantFilter filters used ('none' for none).",
+    labels=("filters",),
+)
+TOGGLES = Counter(
+    "restaurant_toggles_total",
+    "Bookmark and visited changes, by kind and whether they were set or cleared; bulk requests count once.",
+    labels=("kind", "state", "bulk"),
+)
+REVIEW_WRITES = Counter(
+    "restaurant_review_writes_total", "Reviews created, updated or deleted.", labels=("action",)
+)
+
+
+def record_filter_combination(filterset):
+    FILTER_COMBINATIONS.inc(filters="+".join(filterset.active_filters()) or "none")
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-18 17:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0005_review_restaurant_recent_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='restaurant',
+            index=models.Index(fields=['-average_rating', '-id'], name='restaurant_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='restaurant',
+            index=models.Index(condition=models.Q(('is_spotlight', True)), fields=['-average_rating', '-id'], name='restaurant_spotlight_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='restaurant',
+            index=models.Index(fields=['diet_type', 'cost_for_two'], name='restaurant_diet_cost_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='restaurant',
+            index=models.Index(fields=['cost_for_two'], name='restaurant_cost_idx'),
+        ),
+    ]
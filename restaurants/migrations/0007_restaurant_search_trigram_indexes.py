@@ -0,0 +1,38 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+TRIGRAM_INDEXES = [
+    ('restaurant_name_trgm_idx', 'restaurants_restaurant', 'name'),
+    ('restaurant_city_trgm_idx', 'restaurants_restaurant', 'city'),
+    ('restaurant_address_trgm_idx', 'restaurants_restaurant', 'address'),
+    ('cuisine_name_trgm_idx', 'restaurants_cuisine', 'name'),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # GIN/pg_trgm only exist on Postgres; other backends keep the icontains search
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin ({column} gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _, _ in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0006_restaurant_filter_indexes'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 17:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0007_restaurant_search_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurant',
+            name='review_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
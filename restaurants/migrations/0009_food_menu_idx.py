@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-18 17:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0008_restaurant_review_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='food',
+            index=models.Index(fields=['restaurant', 'diet_type', 'name', 'id'], name='food_menu_idx'),
+        ),
+    ]
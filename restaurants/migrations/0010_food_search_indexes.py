@@ -0,0 +1,44 @@
+# Generated by Django 5.2.8 on 2026-10-18 17:24
+
+from django.db import migrations, models
+
+# Same pg_trgm setup as 0007, for the dish search text predicates
+TRIGRAM_INDEXES = [
+    ('food_name_trgm_idx', 'restaurants_food', 'name'),
+    ('food_description_trgm_idx', 'restaurants_food', 'description'),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin ({column} gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _, _ in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0009_food_menu_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='food',
+            index=models.Index(fields=['price', 'id'], name='food_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='food',
+            index=models.Index(fields=['diet_type', 'price', 'id'], name='food_diet_price_idx'),
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.8 on 2026-10-18 17:42
+
+from django.db import migrations, models
+
+
+def backfill_opening_minutes(apps, schema_editor):
+    # Same rule as restaurants.hours.opening_minutes, frozen here
+    Restaurant = apps.get_model('restaurants', 'Restaurant')
+    restaurants = list(Restaurant.objects.only('opening_time', 'closing_time'))
+    for restaurant in restaurants:
+        opening, closing = restaurant.opening_time, restaurant.closing_time
+        restaurant.open_minute = opening.hour * 60 + opening.minute
+        restaurant.close_minute = closing.hour * 60 + closing.minute
+        if restaurant.close_minute <= restaurant.open_minute:
+            restaurant.close_minute += 24 * 60
+    Restaurant.objects.bulk_update(restaurants, ['open_minute', 'close_minute'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0011_restaurant_location'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurant',
+            name='close_minute',
+            field=models.PositiveSmallIntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='open_minute',
+            field=models.PositiveSmallIntegerField(editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_opening_minutes, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='restaurant',
+            index=models.Index(fields=['open_minute', 'close_minute'], name='restaurant_hours_idx'),
+        ),
+    ]
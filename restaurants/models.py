@@ -1,17 +1,90 @@
+from functools import partial
 from django.contrib.auth.models import User
-from django.db import models
+from decimal import Decimal, ROUND_HALF_UP
+from django.db import models, transaction
+from django.utils import timezone
 from django.urls import reverse
-from .managers import RestaurantQuerySet
-from django.db.models import Count, Avg
+from .managers import FoodQuerySet, RestaurantQuerySet, UserRestaurantQuerySet
+from .cache import invalidate_user_bookmarks, invalidate_user_visited
+from .geo import geo_cell
+from .hours import opening_minutes
+from .images import MIME_TYPES, VARIANT_FORMATS, delete_files, strip_metadata, variant_names
+from django.db.models import F
+from django.core.files.base import ContentFile
 
 class TimeStampedModel(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)  
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)  # incremental exports filter on it
 
     class Meta:
         abstract = True
 
 
+class ProcessedImageMixin(models.Model):
+    # For models with an `image` field; filled in by restaurants.images after upload
+    image_width = models.PositiveIntegerField(null=True, editable=False)
+    image_height = models.PositiveIntegerField(null=True, editable=False)
+    image_variants = models.JSONField(default=dict, editable=False)
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def variants_ready(cls, pks):
+        pass
+
+    @classmethod
+    def references_file(cls, name):
+        # The upload or one of its variants; names are content hashes, so the
+        # quoted substring only matches that exact value in the JSON
+        return cls._default_manager.filter(
+            models.Q(image=name) | models.Q(image_variants__icontains=f'"{name}"')
+        ).exists()
+
+    @property
+    def has_variants(self):
+        return bool(self.image) and self.image_variants.get("source") == self.image.name
+
+    def image_sources(self):
+        # (mime type, srcset) per format, best first, for <picture> sources
+        if not self.has_variants:
+            return []
+        storage = self.image.storage
+        return [
+            (MIME_TYPES[fmt], ", ".join(f"{storage.url(name)} {width}w" for width, name in self.image_variants[fmt].items()))
+            for fmt in VARIANT_FORMATS
+            if fmt in self.image_variants
+        ]
+
+    def save(self, *args, **kwargs):
+        # A new upload is stored without its EXIF/XMP; the original is served too
+        if self.image and not self.image._committed:
+            stripped = strip_metadata(self.image)
+            if stripped is not None:
+                self.image.file = ContentFile(stripped, name=self.image.name)
+        # The variants belong to the image being replaced or cleared; their
+        # files, and its own, go after commit unless other rows share them
+        replaced = self.image_variants.get("source")
+        if replaced and replaced != self.image.name:
+            files = {replaced, *variant_names(self.image_variants)}
+            self.image_width = self.image_height = None
+            self.image_variants = {}
+        else:
+            files = None
+        super().save(*args, **kwargs)
+        if files:
+            transaction.on_commit(partial(delete_files, self.image.storage, files))
+
+    @property
+    def display_url(self):
+        # Largest variant of the most widely supported format, else the upload itself
+        if self.has_variants:
+            for fmt in reversed(VARIANT_FORMATS):
+                if fmt in self.image_variants:
+                    return self.image.storage.url(list(self.image_variants[fmt].values())[-1])
+        return self.image.url
+
+
 class Cuisine(models.Model):
     name = models.CharField(max_length=100, unique=True)  
 
@@ -35,36 +108,145 @@ class Restaurant(TimeStampedModel):
     opening_time = models.TimeField()
     closing_time = models.TimeField()
     is_spotlight = models.BooleanField(default=False)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    # Grid bucket of (latitude, longitude), see geo.py; set on save
+    geo_cell = models.BigIntegerField(null=True, blank=True, editable=False)
+    # Opening hours as minute-of-day interval, see hours.py; set on save
+    open_minute = models.PositiveSmallIntegerField(null=True, editable=False)
+    close_minute = models.PositiveSmallIntegerField(null=True, editable=False)
     cuisines = models.ManyToManyField(Cuisine, related_name='restaurants', blank=True)  # A restaurant may start without cuisines
 
+    # Denormalized review aggregates, kept current by the Review signals in signals.py
+    review_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_1_count = models.PositiveIntegerField(default=0)
+    rating_2_count = models.PositiveIntegerField(default=0)
+    rating_3_count = models.PositiveIntegerField(default=0)
+    rating_4_count = models.PositiveIntegerField(default=0)
+    rating_5_count = models.PositiveIntegerField(default=0)
+    # Bumped with every counter change; part of the rendered fragment cache keys
+    review_version = models.PositiveIntegerField(default=0)
+
     objects = RestaurantQuerySet.as_manager()
 
+    class Meta:
+        # Shaped after RestaurantFilter and RestaurantListView's default ordering
+        indexes = [
+            models.Index(fields=['-average_rating', '-id'], name='restaurant_rating_idx'),
+            models.Index(
+                fields=['-average_rating', '-id'],
+                condition=models.Q(is_spotlight=True),
+                name='restaurant_spotlight_idx',
+            ),
+            models.Index(fields=['diet_type', 'cost_for_two'], name='restaurant_diet_cost_idx'),
+            models.Index(fields=['cost_for_two'], name='restaurant_cost_idx'),
+            models.Index(fields=['geo_cell', 'latitude', 'longitude'], name='restaurant_geo_idx'),
+            models.Index(fields=['open_minute', 'close_minute'], name='restaurant_hours_idx'),
+        ]
+
+    # Columns save() derives, and the fields they are derived from
+    DERIVED_FIELDS = {
+        "geo_cell": {"latitude", "longitude"},
+        "open_minute": {"opening_time", "closing_time"},
+        "close_minute": {"opening_time", "closing_time"},
+    }
+
     def __str__(self):
         return self.name
+
+    def set_derived_fields(self):
+        # Also for bulk_create()/bulk_update() callers, which bypass save()
+        self.geo_cell = geo_cell(self.latitude, self.longitude)
+        self.open_minute, self.close_minute = opening_minutes(self.opening_time, self.closing_time)
+
+    def save(self, *args, **kwargs):
+        self.set_derived_fields()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            kwargs["update_fields"] = update_fields | {
+                field for field, sources in self.DERIVED_FIELDS.items() if sources & update_fields
+            }
+        super().save(*args, **kwargs)
     
     def get_absolute_url(self):
         return reverse("restaurants:restaurant_detail", kwargs={"pk": self.pk})
     
     def get_foods_url(self):
         return reverse("restaurants:restaurant_foods", kwargs={"restaurant_id": self.pk})
+
+    @property
+    def cover_image(self):
+        images = getattr(self, "prefetched_images", None)
+        if images is None:
+            return self.images.order_by("pk").first()
+        return images[0] if images else None
+
+    @property
+    def fragment_version(self):
+        # Cached card/detail fragments are keyed on this, so any save, review
+        # counter change or touch() renders them afresh
+        return f"{self.updated_at.timestamp()}-{self.review_version}"
+
+    @classmethod
+    def touch(cls, restaurant_ids):
+        # For related changes (images, cuisines) that don't save the restaurant
+        cls.objects.filter(pk__in=restaurant_ids).update(updated_at=timezone.now())
     
+    @staticmethod
+    def star_count_field(rating):
+        if rating in range(1, 6):
+            return f"rating_{rating}_count"
+        return None
+
+    @staticmethod
+    def calculate_average_rating(review_count, rating_sum):
+        if not review_count:
+            return Decimal("0.0")
+        return (Decimal(rating_sum) / review_count).quantize(Decimal("0.1"), rounding=ROUND_HALF_UP)
+
+    @classmethod
+    def review_counter_updates(cls, added=None, removed=None):
+        # Integer deltas only: Postgres has no integer + boolean operator
+        updates = {
+            "review_count": F("review_count") + (int(added is not None) - int(removed is not None)),
+            "rating_sum": F("rating_sum") + ((added or 0) - (removed or 0)),
+            "review_version": F("review_version") + 1,
+        }
+        for rating, delta in ((added, 1), (removed, -1)):
+            field = cls.star_count_field(rating)
+            if field:
+                updates[field] = F(field) + delta
+        return updates
+
+    @classmethod
+    def record_review_change(cls, restaurant_id, added=None, removed=None):
+        # added/removed are review ratings; an edit passes both
+        if added == removed:
+            return
+
+        updates = cls.review_counter_updates(added, removed)
+        # The rating columns are exported; incremental exports go by updated_at
+        updates["updated_at"] = timezone.now()
+        # The counter UPDATE holds the row lock until commit, so concurrent
+        # writers see each other's increments before recomputing the average.
+        with transaction.atomic():
+            restaurants = cls.objects.filter(pk=restaurant_id)
+            if not restaurants.update(**updates):
+                return
+            counters = restaurants.values("review_count", "rating_sum").get()
+            restaurants.update(average_rating=cls.calculate_average_rating(**counters))
+
     def update_average_rating(self):
-        reviews = self.reviews.all()
-        if reviews.exists():
-            avg = reviews.aggregate(models.Avg('rating'))['rating__avg']
-            self.average_rating = round(avg, 1)
-        else:
-            self.average_rating = 0.0
-        self.save()
+        self.average_rating = self.calculate_average_rating(self.review_count, self.rating_sum)
+        self.save(update_fields=["average_rating"])
 
     def get_rating_stats(self):
-        rating_counts = self.reviews.values('rating').annotate(count=Count('rating'))
+        # Reads the stored star counters, so no GROUP BY over the reviews table
+        rating_data = {str(i): getattr(self, self.star_count_field(i)) for i in range(1, 6)}
 
-        rating_data = {str(i): 0 for i in range(1, 6)}
-        for item in rating_counts:
-            rating_data[str(item['rating'])] = item['count']
-
-        total_reviews = sum(rating_data.values()) or 1  # avoid divide by zero
+        total_reviews = self.review_count or 1  # avoid divide by zero
         rating_percentage = {
             star: round((count / total_reviews) * 100)
             for star, count in rating_data.items()
@@ -77,7 +259,7 @@ class Restaurant(TimeStampedModel):
         return rating_stats
 
 
-class Food(TimeStampedModel):
+class Food(ProcessedImageMixin, TimeStampedModel):
     restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, related_name='menu')
     name = models.CharField(max_length=200)  
     price = models.DecimalField(max_digits=8, decimal_places=2)
@@ -85,14 +267,30 @@ class Food(TimeStampedModel):
     description = models.TextField(blank=True, null=True)  
     cuisines = models.ManyToManyField(Cuisine, related_name='foods', blank=True)  
     image = models.ImageField(upload_to="food_images/%Y/%m/%d/", blank=True, null=True)
+
+    objects = FoodQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['restaurant', 'diet_type', 'name', 'id'], name='food_menu_idx'),
+            # Dish search (FoodFilter) orders by price and filters on diet type
+            models.Index(fields=['price', 'id'], name='food_price_idx'),
+            models.Index(fields=['diet_type', 'price', 'id'], name='food_diet_price_idx'),
+        ]
+
     def __str__(self):
         return f"{self.name} - {self.restaurant.name}"
 
 
-class RestaurantImage(models.Model):
+class RestaurantImage(ProcessedImageMixin):
     restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, related_name="images")
     image = models.ImageField(upload_to="restaurant_images/")  
 
+    @classmethod
+    def variants_ready(cls, pks):
+        # Cached cards and detail fragments show the images
+        Restaurant.touch(cls.objects.filter(pk__in=pks).values_list("restaurant_id", flat=True))
+
 
 class Review(TimeStampedModel):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reviews')
@@ -102,6 +300,21 @@ class Review(TimeStampedModel):
 
     class Meta:
         unique_together = ('user', 'restaurant')  
+        indexes = [
+            # Backs the keyset pagination of a restaurant's reviews, newest first
+            models.Index(fields=['restaurant', '-created_at', '-id'], name='review_restaurant_recent_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if {"restaurant_id", "rating"} <= instance.__dict__.keys():
+            instance.remember_saved_rating()
+        return instance
+
+    def remember_saved_rating(self):
+        # Lets the post_save signal tell an edit apart from a fresh rating
+        self._saved_rating = (self.restaurant_id, self.rating)
 
     def __str__(self):
         return f"{self.user.username} - {self.restaurant.name} - {self.rating}"
@@ -111,6 +324,9 @@ class Bookmark(TimeStampedModel):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='bookmarks')
     restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, related_name='bookmarked_by')
 
+    objects = UserRestaurantQuerySet.as_manager()
+    invalidate_user_cache = staticmethod(invalidate_user_bookmarks)
+
     class Meta:
         unique_together = ('user', 'restaurant')  
 
@@ -122,6 +338,9 @@ class Visited(TimeStampedModel):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='visited_restaurants')
     restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, related_name='visited_by')
 
+    objects = UserRestaurantQuerySet.as_manager()
+    invalidate_user_cache = staticmethod(invalidate_user_visited)
+
     class Meta:
         unique_together = ('user', 'restaurant')  
 
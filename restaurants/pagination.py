@@ -0,0 +1,112 @@
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Case, IntegerField, Q, Value, When
+
+
+@dataclass
+class KeysetPage:
+    object_list: list
+    next_cursor: str | None
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    # Cursor pagination over a fixed ordering such as ("-created_at", "-id").
+    # The last field must be unique. Pages are fetched with a range filter on
+    # the ordering columns instead of an OFFSET, so deep pages stay cheap.
+
+    def __init__(self, queryset, ordering, per_page):
+        self.queryset = queryset
+        self.ordering = list(ordering)
+        self.per_page = per_page
+        self.fields = [(name.lstrip("-"), name.startswith("-")) for name in self.ordering]
+
+    def encode_cursor(self, obj):
+        values = [str(getattr(obj, name)) for name, _ in self.fields]
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def decode_cursor(self, cursor):
+        # Returns None for anything malformed so callers fall back to the first page
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (binascii.Error, ValueError, UnicodeError):
+            return None
+        if not isinstance(values, list) or len(values) != len(self.fields):
+            return None
+
+        model = self.queryset.model
+        try:
+            return [
+                model._meta.get_field(name).to_python(value)
+                for (name, _), value in zip(self.fields, values)
+            ]
+        except ValidationError:
+            return None
+
+    def after(self, values):
+        # (a, b) after (x, y)  ==  a past x OR (a = x AND b past y)
+        condition = Q()
+        for i, (name, descending) in enumerate(self.fields):
+            equal = {prev: values[j] for j, (prev, _) in enumerate(self.fields[:i])}
+            lookup = "lt" if descending else "gt"
+            condition |= Q(**equal, **{f"{name}__{lookup}": values[i]})
+        return condition
+
+    def _page_queryset(self, cursor):
+        queryset = self.queryset.order_by(*self.ordering)
+        values = self.decode_cursor(cursor) if cursor else None
+        if values is not None:
+            queryset = queryset.filter(self.after(values))
+        return queryset[:self.per_page + 1]
+
+    def page(self, cursor=None):
+        return self._build_page(list(self._page_queryset(cursor)))
+
+    async def apage(self, cursor=None):
+        return self._build_page([obj async for obj in self._page_queryset(cursor)])
+
+    def _build_page(self, rows):
+        object_list = rows[:self.per_page]
+        next_cursor = None
+        if len(rows) > self.per_page:
+            next_cursor = self.encode_cursor(object_list[-1])
+        return KeysetPage(object_list, next_cursor)
+
+
+class PrecountedPaginator(Paginator):
+    # Paginator whose total is already known (e.g. from a cache), so
+    # .count never issues a COUNT query
+    def __init__(self, object_list, per_page, count, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count = count
+
+
+def validate_page_number(paginator, page_number):
+    # Same rules as ListView: "last" or a 1-based number, else InvalidPage
+    if page_number == "last":
+        page_number = paginator.num_pages
+    return paginator.validate_number(page_number)
+
+
+def order_by_ids(queryset, ids):
+    # Fetches exactly these rows, in the given order
+    if not ids:
+        return queryset.none()
+    position = Case(
+        *[When(pk=pk, then=Value(i)) for i, pk in enumerate(ids)],
+        output_field=IntegerField(),
+    )
+    return queryset.filter(pk__in=ids).order_by(position)
@@ -0,0 +1,82 @@
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, Q
+from django.db.models.functions import Greatest
+from django.db.models.lookups import PatternLookup
+from django.utils.module_loading import import_string
+
+
+class IContainsSearchBackend:
+    # Plain substring match on the name; what the search filter always did
+    ranked = False
+
+    def search(self, queryset, query):
+        return queryset.filter(name__icontains=query)
+
+    def search_foods(self, queryset, query):
+        return queryset.filter(Q(name__icontains=query) | Q(description__icontains=query))
+
+
+class ILikeContains(PatternLookup):
+    # "col ILIKE '%query%'" on the bare column. pg_trgm GIN indexes serve it;
+    # icontains compiles to UPPER(col::text) LIKE UPPER(...), which they don't.
+    lookup_name = 'ilike_contains'
+
+    def as_sql(self, compiler, connection):
+        lhs_sql, lhs_params = self.process_lhs(compiler, connection)
+        rhs_sql, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs_sql} ILIKE {rhs_sql}', (*lhs_params, *rhs_params)
+
+
+def ilike_contains(field, query):
+    return ILikeContains(F(field), query)
+
+
+class TrigramSearchBackend:
+    # Postgres only. Each branch of the match is a bitmap scan of a pg_trgm
+    # GIN index from migrations 0007 and 0010 (word similarity or ILIKE on
+    # the bare column), and results carry a search_rank for ordering.
+    ranked = True
+
+    def search(self, queryset, query):
+        from django.contrib.postgres.search import TrigramWordSimilarity
+        from .models import Cuisine, Restaurant
+
+        own_columns = Restaurant.objects.filter(
+            Q(name__trigram_word_similar=query)
+            | ilike_contains('name', query)
+            | ilike_contains('city', query)
+            | ilike_contains('address', query)
+        ).values('pk')
+        # A cuisine match ORed in as EXISTS can't use an index, so the whole
+        # filter would fall back to scanning every restaurant; a UNION of
+        # IDs keeps each side on its own index
+        by_cuisine = Restaurant.cuisines.through.objects.filter(
+            cuisine__in=Cuisine.objects.filter(ilike_contains('name', query)),
+        ).values('restaurant_id')
+        return queryset.filter(pk__in=own_columns.union(by_cuisine)).annotate(
+            search_rank=Greatest(
+                TrigramWordSimilarity(query, 'name'),
+                TrigramWordSimilarity(query, 'city'),
+            )
+        )
+
+    def search_foods(self, queryset, query):
+        from django.contrib.postgres.search import TrigramWordSimilarity
+
+        # All three branches are on food columns with trigram indexes (0010),
+        # so Postgres can BitmapOr them instead of scanning every dish
+        return queryset.filter(
+            Q(name__trigram_word_similar=query)
+            | ilike_contains('name', query)
+            | ilike_contains('description', query)
+        ).annotate(search_rank=TrigramWordSimilarity(query, 'name'))
+
+
+def get_search_backend():
+    backend_path = getattr(settings, 'RESTAURANT_SEARCH_BACKEND', None)
+    if backend_path:
+        return import_string(backend_path)()
+    if connection.vendor == 'postgresql':
+        return TrigramSearchBackend()
+    return IContainsSearchBackend()
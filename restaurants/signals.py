@@ -0,0 +1,104 @@
+from functools import partial
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from .cache import bump_list_cache_version, invalidate_user_bookmarks, invalidate_user_visited
+from .images import delete_files, schedule_processing, variant_names
+from .metrics import REVIEW_WRITES
+from .models import Bookmark, Cuisine, Food, Restaurant, RestaurantImage, Review, Visited
+
+
+@receiver(pre_save, sender=Review)
+def remember_rating_before_save(sender, instance, **kwargs):
+    # Instances loaded through the ORM already carry their saved rating
+    if not hasattr(instance, "_saved_rating") and instance.pk:
+        instance._saved_rating = (
+            Review.objects.filter(pk=instance.pk).values_list("restaurant_id", "rating").first()
+        )
+
+
+@receiver(post_save, sender=Review)
+def update_rating_counters_on_save(sender, instance, created, **kwargs):
+    saved = getattr(instance, "_saved_rating", None)
+
+    if created or saved is None:
+        Restaurant.record_review_change(instance.restaurant_id, added=instance.rating)
+    elif saved[0] != instance.restaurant_id:
+        Restaurant.record_review_change(saved[0], removed=saved[1])
+        Restaurant.record_review_change(instance.restaurant_id, added=instance.rating)
+    else:
+        Restaurant.record_review_change(instance.restaurant_id, added=instance.rating, removed=saved[1])
+
+    instance.remember_saved_rating()
+    transaction.on_commit(bump_list_cache_version)
+    REVIEW_WRITES.inc(action="created" if created else "updated")
+
+
+@receiver(post_delete, sender=Review)
+def update_rating_counters_on_delete(sender, instance, **kwargs):
+    Restaurant.record_review_change(instance.restaurant_id, removed=instance.rating)
+    transaction.on_commit(bump_list_cache_version)
+    REVIEW_WRITES.inc(action="deleted")
+
+
+@receiver(post_save, sender=Restaurant)
+@receiver(post_delete, sender=Restaurant)
+@receiver(post_save, sender=Cuisine)
+@receiver(post_delete, sender=Cuisine)
+@receiver(m2m_changed, sender=Restaurant.cuisines.through)
+def invalidate_restaurant_list_cache(sender, **kwargs):
+    # After commit: bumped earlier, a concurrent request could cache
+    # pre-commit results under the new version
+    transaction.on_commit(bump_list_cache_version)
+
+
+@receiver(post_save, sender=RestaurantImage)
+@receiver(post_delete, sender=RestaurantImage)
+def touch_restaurant_on_image_change(sender, instance, **kwargs):
+    Restaurant.touch([instance.restaurant_id])
+
+
+@receiver(post_save, sender=Food)
+@receiver(post_save, sender=RestaurantImage)
+def process_uploaded_image(sender, instance, **kwargs):
+    # Thumbnails are built off the request path once the upload commits
+    if instance.image and not instance.has_variants:
+        schedule_processing(instance)
+
+
+@receiver(post_delete, sender=Food)
+@receiver(post_delete, sender=RestaurantImage)
+def delete_image_files(sender, instance, **kwargs):
+    if instance.image:
+        files = {instance.image.name, *variant_names(instance.image_variants)}
+        transaction.on_commit(partial(delete_files, instance.image.storage, files))
+
+
+@receiver(m2m_changed, sender=Restaurant.cuisines.through)
+def touch_restaurants_on_cuisines_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            Restaurant.touch([instance.pk])
+    elif action in ("post_add", "post_remove"):
+        Restaurant.touch(pk_set)
+    elif action == "pre_clear":
+        # pk_set is empty for clears, so collect the restaurants beforehand
+        Restaurant.touch(list(instance.restaurants.values_list("pk", flat=True)))
+
+
+@receiver(post_save, sender=Cuisine)
+@receiver(pre_delete, sender=Cuisine)
+def touch_restaurants_on_cuisine_change(sender, instance, **kwargs):
+    Restaurant.touch(list(instance.restaurants.values_list("pk", flat=True)))
+
+
+@receiver(post_save, sender=Bookmark)
+@receiver(post_delete, sender=Bookmark)
+def invalidate_bookmark_set(sender, instance, **kwargs):
+    transaction.on_commit(partial(invalidate_user_bookmarks, instance.user_id))
+
+
+@receiver(post_save, sender=Visited)
+@receiver(post_delete, sender=Visited)
+def invalidate_visited_set(sender, instance, **kwargs):
+    transaction.on_commit(partial(invalidate_user_visited, instance.user_id))
@@ -0,0 +1,8 @@
+from django.urls import include, path
+from restaurants.urls import build_urlpatterns
+
+# Same routes as homebite.urls, with the restaurants app on its async views
+urlpatterns = [
+    path('accounts/', include('accounts.urls')),
+    path('', include((build_urlpatterns(use_async_views=True), 'restaurants'), namespace='restaurants')),
+]
@@ -1,3 +1,5 @@
+import itertools
+import random
 import factory
 from django.contrib.auth.models import User
 from django.core.files.uploadedfile import SimpleUploadedFile
@@ -94,3 +96,105 @@ class VisitedFactory(factory.django.DjangoModelFactory):
 
     user = factory.SubFactory(UserFactory)
     restaurant = factory.SubFactory(RestaurantFactory)
+
+
+def bulk_create_restaurants(count, batch_size=5000, seed=0, prefix="Bench Restaurant"):
+    # Fast path for large datasets: build with the factory, insert with bulk_create.
+    # Skips post_generation hooks, so no cuisines are attached.
+    rng = random.Random(seed)
+    created = 0
+    while created < count:
+        size = min(batch_size, count - created)
+        batch = RestaurantFactory.build_batch(
+            size,
+            name=factory.Sequence(lambda n: f"{prefix} {n}"),
+        )
+        for restaurant in batch:
+            restaurant.cost_for_two = rng.randrange(100, 5000, 50)
+            restaurant.diet_type = rng.choice(DietType.values)
+            restaurant.average_rating = round(rng.uniform(1, 5), 1)
+            restaurant.is_spotlight = rng.random() < 0.05
+            # Spread over India
+            restaurant.latitude = rng.uniform(8, 35)
+            restaurant.longitude = rng.uniform(68, 97)
+            restaurant.set_derived_fields()
+        Restaurant.objects.bulk_create(batch, batch_size=batch_size)
+        created += size
+    return created
+
+
+def popularity_weights(count, skew=1.1):
+    # Cumulative Zipf-like weights: the item at rank r is picked in proportion to 1 / r**skew
+    return list(itertools.accumulate(1 / rank ** skew for rank in range(1, count + 1)))
+
+
+def _batches(items, batch_size):
+    items = iter(items)
+    while batch := list(itertools.islice(items, batch_size)):
+        yield batch
+
+
+def bulk_create_users(count, batch_size=5000, prefix="bench_user"):
+    # Unusable passwords: hashing one per user would dominate the run
+    users = (User(username=f"{prefix}{n}", email=f"{prefix}{n}@example.com", password="!") for n in range(count))
+    for batch in _batches(users, batch_size):
+        User.objects.bulk_create(batch, batch_size=batch_size)
+    return list(User.objects.filter(username__startswith=prefix).values_list("pk", flat=True))
+
+
+def bulk_attach_cuisines(restaurant_ids, cuisine_ids, per_restaurant=(1, 3), batch_size=5000, seed=0):
+    rng = random.Random(seed)
+    through = Restaurant.cuisines.through
+    links = (
+        through(restaurant_id=restaurant_id, cuisine_id=cuisine_id)
+        for restaurant_id in restaurant_ids
+        for cuisine_id in rng.sample(cuisine_ids, min(rng.randint(*per_restaurant), len(cuisine_ids)))
+    )
+    for batch in _batches(links, batch_size):
+        through.objects.bulk_create(batch, batch_size=batch_size)
+
+
+def bulk_create_foods(restaurant_ids, count, batch_size=5000, seed=0):
+    # Spread evenly, so every restaurant has a menu; names repeat across restaurants
+    rng = random.Random(seed)
+    per_restaurant = max(count // max(len(restaurant_ids), 1), 1)
+    created = 0
+    for restaurant_id in itertools.cycle(restaurant_ids):
+        if created >= count:
+            break
+        size = min(per_restaurant, count - created)
+        batch = FoodFactory.build_batch(size, restaurant=None, description="")
+        for n, food in enumerate(batch):
+            food.restaurant_id = restaurant_id
+            food.name = f"Dish {n}"
+            food.price = rng.randrange(50, 1500)
+            food.diet_type = rng.choice(DietType.values)
+        Food.objects.bulk_create(batch, batch_size=batch_size)
+        created += size
+    return created
+
+
+def bulk_create_reviews(restaurant_ids, user_ids, count, popularity, batch_size=5000, seed=0):
+    # Each user reviews popular restaurants far more often than the long tail;
+    # (user, restaurant) is unique, so repeats are dropped and the count of
+    # rows actually inserted is returned. Rating counters are not updated:
+    # run rebuild_rating_counters afterwards.
+    rng = random.Random(seed)
+    per_user = max(count // max(len(user_ids), 1), 1)
+    per_user = min(per_user, len(restaurant_ids))
+
+    def reviews():
+        created = 0
+        for user_id in itertools.cycle(user_ids):
+            if created >= count:
+                return
+            picked = set(rng.choices(restaurant_ids, cum_weights=popularity, k=min(per_user, count - created)))
+            for restaurant_id in picked:
+                yield Review(user_id=user_id, restaurant_id=restaurant_id, rating=rng.randint(1, 5), comment="")
+            created += len(picked)
+
+    before = Review.objects.count()
+    for batch in _batches(reviews(), batch_size):
+        Review.objects.bulk_create(batch, batch_size=batch_size, ignore_conflicts=True)
+    # ignore_conflicts hides which rows were skipped
+    return Review.objects.count() - before
@@ -1,3 +1,5 @@
+from django.conf import settings
+from django.core.cache import cache
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from .factories import (
@@ -26,9 +28,19 @@ class AuthMixin(TestCase):
         return user
 
 
+class QueryBudgetMixin(TestCase):
+    def assertWithinQueryBudget(self, response, budget=None):
+        # Numbers recorded by homebite.instrumentation.RequestStatsMiddleware
+        view_name = response.resolver_match.view_name
+        budget = budget if budget is not None else settings.QUERY_BUDGETS[view_name]
+        queries = response.request_stats.queries
+        self.assertLessEqual(queries, budget, f"{view_name} ran {queries} queries, over its budget of {budget}")
+
+
 class RestaurantTestSetupMixin(AuthMixin):
     def setUp(self):
         super().setUp()
+        cache.clear()
         
         self.user = self.create_user()
         self.login_user(self.user)
@@ -1,9 +1,46 @@
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
+from io import BytesIO, StringIO
+import json
+import tempfile
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.template import engines
 from django.urls import reverse
-from django.test import TestCase
-from .models import Bookmark, Visited, Review, Restaurant
-from restaurants.test_restaurants.mixins import RestaurantTestSetupMixin
+from django.http import Http404
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.db.models import Count
+from pathlib import Path
+from .models import Bookmark, DietType, Food, Visited, Review, Restaurant, RestaurantImage
+from restaurants.test_restaurants.mixins import QueryBudgetMixin, RestaurantTestSetupMixin
+from restaurants.test_restaurants.factories import ReviewFactory, RestaurantFactory, RestaurantImageFactory, BookmarkFactory, VisitedFactory, CuisineFactory, FoodFactory, UserFactory, bulk_create_reviews, bulk_create_users, popularity_weights
 from django.contrib.auth.models import User
+from restaurants.cache import list_cache_version
 from restaurants.filters import RestaurantFilter
+from restaurants.importers import CatalogImporter, RestaurantImporter
+from restaurants.search import IContainsSearchBackend, TrigramSearchBackend, get_search_backend
+from PIL import Image
+from restaurants.images import VARIANT_FORMATS, variant_names
+from homebite.instrumentation import QueryBudgetExceeded, reset_view_stats, view_stats
+from homebite.media import serve_media
+from homebite.metrics import REGISTRY, Counter, Histogram, Registry
+from homebite.template_loading import preload_templates, render_stats, reset_render_stats
+
+
+def postgres_sql(queryset):
+    # The SQL a queryset compiles to on Postgres, without connecting to one
+    from django.db.backends.postgresql.base import DatabaseWrapper
+
+    postgres = DatabaseWrapper({**connection.settings_dict, "ENGINE": "django.db.backends.postgresql"})
+    sql, params = queryset.query.get_compiler(connection=postgres).as_sql()
+    return sql % tuple(repr(param) for param in params)
+
 
 class TestRestaurantListView(RestaurantTestSetupMixin, TestCase):
     def test_list_page_should_load_restaurants(self):
@@ -19,6 +56,126 @@ class TestRestaurantListView(RestaurantTestSetupMixin, TestCase):
         response = self.client.get(reverse("restaurants:restaurant_list"))
         self.assertContains(response, self.restaurant.get_absolute_url())
 
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+    def test_list_page_query_count_should_not_grow_with_page_size(self):
+        for restaurant in self.restaurants:
+            RestaurantImageFactory(restaurant=restaurant)
+        url = reverse("restaurants:restaurant_list")
+
+        cache.clear()  # compare two cold requests, not a cache hit with a miss
+        with CaptureQueriesContext(connection) as small_page:
+            response = self.client.get(url)
+        self.assertContains(response, "/media/restaurant_images/")
+
+        for _ in range(4):
+            RestaurantImageFactory(restaurant=RestaurantFactory())
+
+        cache.clear()
+        with CaptureQueriesContext(connection) as full_page:
+            response = self.client.get(url)
+        self.assertEqual(len(response.context["restaurants"]), 10)
+        self.assertEqual(len(full_page), len(small_page))
+
+    def test_list_page_should_flag_user_bookmarks_without_subqueries(self):
+        BookmarkFactory(user=self.user, restaurant=self.restaurant)
+        VisitedFactory(user=self.user, restaurant=self.restaurant)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("restaurants:restaurant_list"))
+
+        flagged = {r.pk: (r.is_bookmarked, r.is_visited) for r in response.context["restaurants"]}
+        self.assertEqual(flagged[self.restaurant.pk], (True, True))
+        self.assertEqual(flagged[self.restaurants[0].pk], (False, False))
+        restaurant_queries = [q["sql"] for q in queries if 'FROM "restaurants_restaurant"' in q["sql"]]
+        self.assertFalse(any("EXISTS" in sql for sql in restaurant_queries))
+
+    def test_bookmark_set_cache_should_refresh_after_bookmark_changes(self):
+        url = reverse("restaurants:restaurant_list")
+        self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            bookmark = BookmarkFactory(user=self.user, restaurant=self.restaurant)
+        response = self.client.get(url)
+        flagged = {r.pk: r.is_bookmarked for r in response.context["restaurants"]}
+        self.assertTrue(flagged[self.restaurant.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            bookmark.delete()
+        response = self.client.get(url)
+        flagged = {r.pk: r.is_bookmarked for r in response.context["restaurants"]}
+        self.assertFalse(flagged[self.restaurant.pk])
+
+    def test_repeated_list_request_should_be_served_from_result_cache(self):
+        url = reverse("restaurants:restaurant_list") + "?diet_type=1&cost_for_two_min=100"
+        first = self.client.get(url)
+
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(url)
+
+        self.assertEqual(list(second.context["restaurants"]), list(first.context["restaurants"]))
+        self.assertFalse(any('COUNT(*) AS "__count" FROM "restaurants_restaurant"' in q["sql"] for q in queries))
+
+    def test_uncached_page_should_reuse_cached_filter_count(self):
+        RestaurantFactory.create_batch(6)
+        url = reverse("restaurants:restaurant_list")
+        self.client.get(url)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {"page": 2})
+
+        self.assertEqual(response.context["paginator"].count, 12)
+        self.assertEqual(len(response.context["restaurants"]), 2)
+        self.assertFalse(any('COUNT(*) AS "__count" FROM "restaurants_restaurant"' in q["sql"] for q in queries))
+
+    def test_result_cache_should_be_invalidated_when_restaurant_changes(self):
+        url = reverse("restaurants:restaurant_list") + "?is_spotlight=true"
+        self.assertEqual(len(self.client.get(url).context["restaurants"]), 0)
+
+        self.restaurant.is_spotlight = True
+        with self.captureOnCommitCallbacks(execute=True):
+            self.restaurant.save()
+
+        self.assertEqual(list(self.client.get(url).context["restaurants"]), [self.restaurant])
+
+    def test_list_cache_version_should_only_change_on_commit(self):
+        version = list_cache_version()
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.restaurant.save()
+            ReviewFactory(restaurant=self.restaurant)
+        self.assertEqual(list_cache_version(), version)
+
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(list_cache_version(), version)
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+    def test_cached_cards_should_skip_cover_images_but_keep_user_toggles(self):
+        RestaurantImageFactory(restaurant=self.restaurant)
+        url = reverse("restaurants:restaurant_list")
+        self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            BookmarkFactory(user=self.user, restaurant=self.restaurant)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+
+        self.assertFalse(any("restaurants_restaurantimage" in q["sql"] for q in queries))
+        self.assertContains(response, 'data-bookmarked="true"', count=1)
+
+    def test_card_fragment_should_refresh_when_restaurant_or_rating_changes(self):
+        url = reverse("restaurants:restaurant_list")
+        self.client.get(url)
+
+        self.restaurant.city = "Renamed City"
+        self.restaurant.save()
+        self.assertContains(self.client.get(url), "Renamed City")
+
+        ReviewFactory(restaurant=self.restaurant, rating=3)
+        self.restaurant.refresh_from_db()
+        self.assertEqual(self.restaurant.average_rating, Decimal("3.0"))
+        self.assertContains(self.client.get(url), "3.0")
+
     def test_price_filter_should_include_restaurants_within_range(self):
         response = self.client.get(
             reverse("restaurants:restaurant_list") + "?cost_for_two_min=100&cost_for_two_max=300"
@@ -59,6 +216,28 @@ class TestRestaurantListView(RestaurantTestSetupMixin, TestCase):
         for r in excluded:
             self.assertNotContains(response, r.name)
 
+    def test_multiple_cuisine_filter_should_return_each_restaurant_once(self):
+        cuisine_ids = [c.id for c in self.cuisines]
+        qs = RestaurantFilter(data={"cuisines": cuisine_ids}, queryset=Restaurant.objects.all()).qs
+
+        expected = [r for r in self.restaurants if r.cuisines.filter(id__in=cuisine_ids).exists()]
+        self.assertCountEqual(list(qs), expected)
+        self.assertNotIn("DISTINCT", str(qs.query))
+
+    def test_combined_filters_should_not_need_distinct(self):
+        data = {"cuisines": [self.cuisines[0].id], "diet_type": ["1"], "rating": ["4"]}
+        qs = RestaurantFilter(data=data, queryset=Restaurant.objects.all()).qs
+
+        self.assertNotIn("DISTINCT", str(qs.query))
+
+    def test_bookmarked_filter_should_only_list_user_bookmarks(self):
+        BookmarkFactory(user=self.user, restaurant=self.restaurants[1])
+        BookmarkFactory(restaurant=self.restaurants[2])
+
+        response = self.client.get(reverse("restaurants:restaurant_list"), {"bookmarked": "true"})
+
+        self.assertEqual(list(response.context["restaurants"]), [self.restaurants[1]])
+
     def test_rating_filter_should_include_selected_rating(self):
         response = self.client.get(reverse("restaurants:restaurant_list"), {"rating": ["5"]})
 
@@ -204,6 +383,147 @@ class TestRestaurantListView(RestaurantTestSetupMixin, TestCase):
             self.assertContains(response, r.name)
 
 
+class CityOnlySearchBackend:
+    ranked = False
+
+    def search(self, queryset, query):
+        return queryset.filter(city__iexact=query)
+
+
+class TestRestaurantNearFilter(RestaurantTestSetupMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        # Bengaluru city centre, ~5 km and ~40 km away, and Chennai (~290 km)
+        self.centre = RestaurantFactory(name="Centre", latitude=12.9716, longitude=77.5946)
+        self.nearby = RestaurantFactory(name="Nearby", latitude=13.0166, longitude=77.5946)
+        self.outskirts = RestaurantFactory(name="Outskirts", latitude=12.9716, longitude=77.9630)
+        self.far = RestaurantFactory(name="Chennai", latitude=13.0827, longitude=80.2707)
+
+    def test_save_should_assign_geo_cell(self):
+        self.assertIsNotNone(self.centre.geo_cell)
+        self.assertIsNone(self.restaurant.geo_cell)
+
+        self.restaurant.latitude, self.restaurant.longitude = 13.0827, 80.2707
+        self.restaurant.save(update_fields=["latitude", "longitude"])
+        self.restaurant.refresh_from_db()
+        self.assertEqual(self.restaurant.geo_cell, self.far.geo_cell)
+
+    def test_radius_filter_should_list_restaurants_within_radius_by_distance(self):
+        response = self.client.get(reverse("restaurants:restaurant_list"), {"near": "12.97,77.59", "radius_km": 50})
+
+        restaurants = list(response.context["restaurants"])
+        self.assertEqual(restaurants, [self.centre, self.nearby, self.outskirts])
+        self.assertAlmostEqual(restaurants[1].distance_km, 5.2, delta=0.3)
+        self.assertContains(response, "5.2 km")
+
+    def test_near_without_radius_should_return_nearest_restaurants(self):
+        response = self.client.get(reverse("restaurants:restaurant_list"), {"near": "12.97,77.59"})
+
+        # Chennai is beyond MAX_RADIUS_KM, so fewer than NEAREST_K exist
+        self.assertEqual(list(response.context["restaurants"]), [self.centre, self.nearby, self.outskirts])
+
+    def test_nearest_should_return_only_the_k_closest(self):
+        found = Restaurant.objects.nearest(12.97, 77.59, k=2, start_radius_km=100)
+
+        self.assertCountEqual(found, [self.centre, self.nearby])
+
+    def test_near_with_explicit_sort_should_sort_the_nearest_k(self):
+        self.centre.cost_for_two, self.nearby.cost_for_two, self.outskirts.cost_for_two = 300, 900, 1500
+        for restaurant in (self.centre, self.nearby, self.outskirts):
+            restaurant.save(update_fields=["cost_for_two"])
+
+        with mock.patch.object(RestaurantFilter, "NEAREST_K", 2):
+            response = self.client.get(
+                reverse("restaurants:restaurant_list"), {"near": "12.97,77.59", "sort_by": "price_high"}
+            )
+
+        self.assertEqual(list(response.context["restaurants"]), [self.nearby, self.centre])
+
+    def test_radius_search_should_cross_the_antimeridian(self):
+        east = RestaurantFactory(latitude=-17.0, longitude=179.95)
+
+        found = Restaurant.objects.within_radius(-17.0, -179.95, 20)
+
+        self.assertEqual(list(found), [east])
+
+    def test_invalid_location_should_be_ignored(self):
+        response = self.client.get(reverse("restaurants:restaurant_list"), {"near": "north"})
+
+        self.assertIn(self.far, response.context["restaurants"])
+
+
+class TestRestaurantOpeningHoursFilter(RestaurantTestSetupMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.late = RestaurantFactory(opening_time="18:00", closing_time="02:00")
+        self.all_day = RestaurantFactory(opening_time="00:00", closing_time="00:00")
+
+    def open_at(self, value):
+        response = self.client.get(reverse("restaurants:restaurant_list"), {"open_at": value})
+        return set(response.context["paginator"].object_list)
+
+    def test_save_should_store_overnight_hours_past_midnight(self):
+        self.assertEqual((self.late.open_minute, self.late.close_minute), (18 * 60, 26 * 60))
+        self.assertEqual((self.all_day.open_minute, self.all_day.close_minute), (0, 24 * 60))
+
+    def test_open_at_should_handle_daytime_and_overnight_hours(self):
+        self.assertNotIn(self.late, self.open_at("12:00"))
+        self.assertIn(self.restaurant, self.open_at("12:00"))
+        self.assertEqual(self.open_at("23:30"), {self.late, self.all_day})
+        self.assertEqual(self.open_at("01:15"), {self.late, self.all_day})
+        self.assertEqual(self.open_at("02:00"), {self.all_day})
+
+    def test_near_should_pick_the_nearest_among_open_restaurants(self):
+        # The two closest are shut at 21:00; the next two are open
+        for offset, opening in ((0.001, "09:00"), (0.002, "09:00"), (0.01, "18:00"), (0.02, "18:00")):
+            RestaurantFactory(latitude=12.0 + offset, longitude=77.0, opening_time=opening, closing_time="20:00" if opening == "09:00" else "23:00")
+
+        with mock.patch.object(RestaurantFilter, "NEAREST_K", 2):
+            response = self.client.get(reverse("restaurants:restaurant_list"), {"near": "12.0,77.0", "open_at": "21:00"})
+
+        restaurants = list(response.context["restaurants"])
+        self.assertEqual([round(r.latitude - 12.0, 3) for r in restaurants], [0.01, 0.02])
+
+    @override_settings(TIME_ZONE="Asia/Kolkata")
+    def test_open_now_should_use_local_time_and_skip_the_shared_cache(self):
+        # 18:00 UTC is 23:30 in Kolkata
+        with mock.patch("django.utils.timezone.now", return_value=datetime(2025, 1, 1, 18, 0, tzinfo=dt_timezone.utc)):
+            response = self.client.get(reverse("restaurants:restaurant_list"), {"open_now": "true"})
+
+        self.assertEqual(set(response.context["restaurants"]), {self.late, self.all_day})
+        self.assertFalse(response.context["filter"].is_shareable())
+
+
+class TestRestaurantSearchBackend(RestaurantTestSetupMixin, TestCase):
+    def test_sqlite_should_fall_back_to_icontains_search(self):
+        self.assertIsInstance(get_search_backend(), IContainsSearchBackend)
+
+        qs = RestaurantFilter(data={"search": "RESTAURANT"}, queryset=Restaurant.objects.all()).qs
+        self.assertCountEqual(qs, Restaurant.objects.all())
+
+    @override_settings(RESTAURANT_SEARCH_BACKEND="restaurants.tests.CityOnlySearchBackend")
+    def test_search_filter_should_use_configured_backend(self):
+        qs = RestaurantFilter(data={"search": self.restaurant.city}, queryset=Restaurant.objects.all()).qs
+
+        self.assertIn(self.restaurant, qs)
+        self.assertTrue(all(r.city.lower() == self.restaurant.city.lower() for r in qs))
+
+    def test_trigram_search_should_compile_to_index_friendly_sql(self):
+        sql = postgres_sql(TrigramSearchBackend().search(Restaurant.objects.all(), "pan"))
+
+        self.assertIn('"name" ILIKE', sql)
+        self.assertIn("UNION", sql)
+        self.assertNotIn("UPPER(", sql)
+        self.assertNotIn("EXISTS", sql)
+
+    def test_trigram_dish_search_should_compile_to_index_friendly_sql(self):
+        sql = postgres_sql(TrigramSearchBackend().search_foods(Food.objects.all(), "paneer"))
+
+        self.assertIn('"name" ILIKE', sql)
+        self.assertIn('"description" ILIKE', sql)
+        self.assertNotIn("UPPER(", sql)
+
+
 class TestRestaurantDetailView(RestaurantTestSetupMixin, TestCase):
     def test_detail_page_should_display_correct_restaurant(self):
         url = reverse("restaurants:restaurant_detail", kwargs={"pk": self.restaurant.pk})
@@ -211,6 +531,132 @@ class TestRestaurantDetailView(RestaurantTestSetupMixin, TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, self.restaurant.name)
 
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+    def test_cached_sections_should_skip_images_and_cuisines(self):
+        RestaurantImageFactory(restaurant=self.restaurant)
+        url = reverse("restaurants:restaurant_detail", kwargs={"pk": self.restaurant.pk})
+        self.client.get(url)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+
+        self.assertContains(response, self.cuisine.name)
+        self.assertContains(response, "/media/restaurant_images/")
+        self.assertFalse(any("restaurants_restaurantimage" in q["sql"] for q in queries))
+        self.assertFalse(any('FROM "restaurants_cuisine"' in q["sql"] for q in queries))
+
+    def test_cached_sections_should_refresh_on_cuisine_and_review_changes(self):
+        url = reverse("restaurants:restaurant_detail", kwargs={"pk": self.restaurant.pk})
+        self.client.get(url)
+
+        self.restaurant.cuisines.add(CuisineFactory(name="Thai"))
+        self.assertContains(self.client.get(url), "Thai")
+
+        self.cuisine.name = "Renamed Cuisine"
+        self.cuisine.save()
+        self.assertContains(self.client.get(url), "Renamed Cuisine")
+
+        ReviewFactory(restaurant=self.restaurant)
+        self.assertContains(self.client.get(url), '<span id="review-count">1</span>')
+
+
+class TestReviewPagination(RestaurantTestSetupMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.reviews = [ReviewFactory(restaurant=self.restaurant) for _ in range(12)]
+        self.newest_first = sorted(self.reviews, key=lambda r: (r.created_at, r.id), reverse=True)
+
+    def test_detail_page_should_show_only_first_page_of_reviews(self):
+        url = reverse("restaurants:restaurant_detail", kwargs={"pk": self.restaurant.pk})
+        response = self.client.get(url)
+
+        reviews = response.context["reviews"]
+        self.assertEqual(list(reviews), self.newest_first[:10])
+        self.assertTrue(reviews.has_next)
+        self.assertContains(response, "loadMoreReviews")
+
+    def test_load_more_should_return_next_page_after_cursor(self):
+        url = reverse("restaurants:restaurant_detail", kwargs={"pk": self.restaurant.pk})
+        cursor = self.client.get(url).context["reviews"].next_cursor
+
+        response = self.client.get(
+            reverse("restaurants:review_list", kwargs={"restaurant_id": self.restaurant.pk}),
+            {"cursor": cursor},
+        )
+
+        data = response.json()
+        self.assertIsNone(data["next_cursor"])
+        for review in self.newest_first[10:]:
+            self.assertIn(f'data-review-id="{review.id}"', data["html"])
+        for review in self.newest_first[:10]:
+            self.assertNotIn(f'data-review-id="{review.id}"', data["html"])
+
+    def test_invalid_cursor_should_fall_back_to_first_page(self):
+        response = self.client.get(
+            reverse("restaurants:review_list", kwargs={"restaurant_id": self.restaurant.pk}),
+            {"cursor": "not-a-cursor"},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(f'data-review-id="{self.newest_first[0].id}"', response.json()["html"])
+
+
+@override_settings(ROOT_URLCONF="restaurants.test_restaurants.async_urls")
+class TestAsyncViews(RestaurantTestSetupMixin, TestCase):
+    async def test_async_list_should_match_sync_filtering_and_flags(self):
+        await Bookmark.objects.acreate(user=self.user, restaurant=self.restaurant)
+        await self.async_client.aforce_login(self.user)
+
+        response = await self.async_client.get(reverse("restaurants:restaurant_list"), {"diet_type": "1"})
+
+        self.assertEqual(response.status_code, 200)
+        restaurants = response.context["restaurants"]
+        self.assertIn(self.restaurant, restaurants)
+        flagged = {r.pk: r.is_bookmarked for r in restaurants}
+        self.assertTrue(flagged[self.restaurant.pk])
+        self.assertContains(response, self.restaurant.name)
+
+    async def test_async_detail_should_render_restaurant_and_reviews(self):
+        review = await Review.objects.acreate(user=self.user, restaurant=self.restaurant, rating=4, comment="Tasty")
+
+        response = await self.async_client.get(
+            reverse("restaurants:restaurant_detail", kwargs={"pk": self.restaurant.pk})
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, self.restaurant.name)
+        self.assertContains(response, self.cuisine.name)
+        self.assertEqual(list(response.context["reviews"]), [review])
+        # Fetched alongside the reviews rather than lazily by the template
+        self.assertEqual(response.context["cuisines"], [self.cuisine])
+        self.assertEqual(response.context["images"], [])
+
+    async def test_async_food_list_should_show_menu(self):
+        response = await self.async_client.get(
+            reverse("restaurants:restaurant_foods", kwargs={"restaurant_id": self.restaurant.pk})
+        )
+
+        self.assertContains(response, self.food.name)
+
+
+class TestTemplateLoading(RestaurantTestSetupMixin, TestCase):
+    def test_preload_should_compile_project_templates(self):
+        loader = engines["django"].engine.template_loaders[0]
+        loader.reset()
+
+        self.assertGreater(preload_templates(), 0)
+        self.assertIn("restaurants/list.html", loader.get_template_cache)
+        self.assertIn("restaurant_card.html", loader.get_template_cache)
+
+    def test_render_times_should_be_recorded_per_template(self):
+        reset_render_stats()
+        self.client.get(reverse("restaurants:restaurant_list"))
+
+        stats = render_stats()
+        self.assertEqual(stats["restaurant_card.html"]["count"], 6)
+        self.assertEqual(stats["restaurants/list.html"]["count"], 1)
+        self.assertGreaterEqual(stats["restaurants/list.html"]["total_ms"], stats["restaurant_card.html"]["total_ms"])
+
 
 class TestFoodListView(RestaurantTestSetupMixin, TestCase):
     def test_food_list_should_show_related_food(self):
@@ -223,6 +669,86 @@ class TestFoodListView(RestaurantTestSetupMixin, TestCase):
         response = self.client.get(url)
         self.assertContains(response, self.food.name)
 
+    def test_menu_should_be_paginated_and_grouped_by_diet_type(self):
+        FoodFactory.create_batch(20, restaurant=self.restaurant, diet_type=DietType.NON_VEG)
+        FoodFactory.create_batch(10, restaurant=self.restaurant, diet_type=DietType.VEG)
+        url = reverse("restaurants:restaurant_foods", kwargs={"restaurant_id": self.restaurant.pk})
+
+        response = self.client.get(url)
+        foods = response.context["foods"]
+        self.assertEqual(response.context["paginator"].count, 31)
+        self.assertEqual(len(foods), 24)
+        self.assertEqual([f.diet_type for f in foods], sorted(f.diet_type for f in foods))
+        self.assertContains(response, "<h2 class=\"text-xl font-semibold mb-4\">Veg</h2>", html=False)
+
+        response = self.client.get(url, {"page": 2})
+        self.assertEqual(len(response.context["foods"]), 7)
+
+    def test_menu_query_count_should_not_grow_with_menu_size(self):
+        url = reverse("restaurants:restaurant_foods", kwargs={"restaurant_id": self.restaurant.pk})
+        with CaptureQueriesContext(connection) as small_menu:
+            self.client.get(url)
+
+        FoodFactory.create_batch(30, restaurant=self.restaurant, cuisines=[self.cuisine])
+        with CaptureQueriesContext(connection) as large_menu:
+            response = self.client.get(url)
+            [str(food) for food in response.context["foods"]]
+
+        self.assertEqual(len(large_menu), len(small_menu))
+
+    def test_menu_should_filter_by_cuisine(self):
+        other = FoodFactory(restaurant=self.restaurant, cuisines=[self.cuisines[0]])
+        url = reverse("restaurants:restaurant_foods", kwargs={"restaurant_id": self.restaurant.pk})
+
+        response = self.client.get(url, {"cuisine": self.cuisines[0].pk})
+
+        self.assertEqual(list(response.context["foods"]), [other])
+        self.assertEqual(set(response.context["cuisines"]), {self.cuisines[0], self.cuisine})
+
+
+class TestDishSearchView(RestaurantTestSetupMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse("restaurants:dish_search")
+        self.paneer = FoodFactory(restaurant=self.restaurant, name="Paneer Tikka", price=250)
+        self.paneer_roll = FoodFactory(restaurant=self.restaurants[0], name="Paneer Roll", price=120)
+        self.chicken = FoodFactory(
+            restaurant=self.restaurants[0], name="Chicken Curry", price=300,
+            diet_type=DietType.NON_VEG, description="Slow cooked with paneer-free gravy",
+        )
+
+    def test_search_should_find_dishes_across_restaurants_grouped_by_restaurant(self):
+        response = self.client.get(self.url, {"q": "paneer"})
+
+        groups = response.context["restaurant_groups"]
+        self.assertEqual(
+            [(restaurant, dishes) for restaurant, dishes in groups],
+            [(self.restaurants[0], [self.paneer_roll, self.chicken]), (self.restaurant, [self.paneer])],
+        )
+
+    def test_search_should_filter_by_price_and_diet_type(self):
+        response = self.client.get(self.url, {"price_min": 200, "price_max": 400, "diet_type": DietType.VEG})
+
+        self.assertEqual(list(response.context["dishes"]), [self.paneer])
+
+    def test_search_should_filter_by_cuisine(self):
+        italian = FoodFactory(restaurant=self.restaurants[1], cuisines=[self.cuisines[0]])
+        response = self.client.get(self.url, {"cuisines": self.cuisines[0].pk})
+
+        self.assertIn(italian, response.context["dishes"])
+        self.assertNotIn(self.paneer, response.context["dishes"])
+
+    def test_search_should_return_only_top_results(self):
+        FoodFactory.create_batch(60, restaurant=self.restaurant, price=10)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {"sort_by": "price_low"})
+
+        self.assertEqual(len(response.context["dishes"]), 50)
+        self.assertTrue(all(dish.price == 10 for dish in response.context["dishes"]))
+        food_queries = [q["sql"] for q in queries if 'FROM "restaurants_food"' in q["sql"]]
+        self.assertTrue(all("LIMIT 50" in sql for sql in food_queries))
+
 
 class TestToggleBookmark(RestaurantTestSetupMixin, TestCase):
     def test_user_should_toggle_bookmark_on(self):
@@ -248,6 +774,65 @@ class TestToggleBookmark(RestaurantTestSetupMixin, TestCase):
         self.assertJSONEqual(response.content, {"bookmarked": False})
 
 
+class TestToggleUnknownRestaurant(TransactionTestCase):
+    # The restaurant FK is checked at commit, so this needs the view's
+    # atomic block to be a real transaction rather than a test savepoint
+    def setUp(self):
+        self.user = UserFactory()
+        self.client.force_login(self.user)
+
+    def test_toggle_should_404_for_unknown_restaurant(self):
+        response = self.client.post(reverse("restaurants:toggle_bookmark"), {"restaurant_id": 999999})
+
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Bookmark.objects.exists())
+
+    def test_bulk_set_should_404_for_unknown_restaurant(self):
+        restaurant = RestaurantFactory()
+
+        response = self.client.post(
+            reverse("restaurants:bulk_visited"), {"restaurant_id": [restaurant.pk, 999999], "visited": "true"}
+        )
+
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Visited.objects.exists())
+
+
+class TestBulkBookmark(RestaurantTestSetupMixin, TestCase):
+    def test_user_should_bookmark_many_restaurants_at_once(self):
+        ids = [r.id for r in self.restaurants[:3]]
+        response = self.client.post(reverse("restaurants:bulk_bookmark"), {"restaurant_id": ids, "bookmarked": "true"})
+
+        self.assertJSONEqual(response.content, {"bookmarked": True, "restaurant_ids": sorted(ids)})
+        self.assertCountEqual(
+            Bookmark.objects.filter(user=self.user).values_list("restaurant_id", flat=True), ids
+        )
+
+    def test_bulk_set_should_be_idempotent_and_unset_should_remove(self):
+        ids = [r.id for r in self.restaurants[:2]]
+        url = reverse("restaurants:bulk_bookmark")
+        self.client.post(url, {"restaurant_id": ids, "bookmarked": "true"})
+        self.client.post(url, {"restaurant_id": ids, "bookmarked": "true"})
+        self.assertEqual(Bookmark.objects.filter(user=self.user).count(), 2)
+
+        self.client.post(url, {"restaurant_id": ids[:1], "bookmarked": "false"})
+        self.assertEqual(
+            list(Bookmark.objects.filter(user=self.user).values_list("restaurant_id", flat=True)), ids[1:]
+        )
+
+    def test_toggle_should_reject_invalid_restaurant_id(self):
+        response = self.client.post(reverse("restaurants:toggle_bookmark"), {"restaurant_id": "abc"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_toggle_should_not_load_the_restaurant(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse("restaurants:toggle_bookmark"), {"restaurant_id": self.restaurant.id})
+
+        tables = " ".join(q["sql"] for q in queries)
+        self.assertNotIn('FROM "restaurants_restaurant"', tables)
+        self.assertTrue(Bookmark.objects.filter(user=self.user, restaurant=self.restaurant).exists())
+
+
 class TestToggleVisited(RestaurantTestSetupMixin, TestCase):
     def test_user_should_toggle_visited_on(self):
         url = reverse("restaurants:toggle_visited")
@@ -317,3 +902,598 @@ class TestDeleteReviewView(RestaurantTestSetupMixin):
         response = self.client.post(url)
         self.assertEqual(response.status_code, 403)
         self.assertTrue(Review.objects.filter(id=review_by_other.id).exists())
+
+
+class TestRestaurantRatingCounters(RestaurantTestSetupMixin, TestCase):
+    def test_creating_reviews_should_increment_counters(self):
+        ReviewFactory(restaurant=self.restaurant, rating=5)
+        ReviewFactory(restaurant=self.restaurant, rating=2)
+
+        self.restaurant.refresh_from_db()
+        self.assertEqual(self.restaurant.review_count, 2)
+        self.assertEqual(self.restaurant.rating_sum, 7)
+        self.assertEqual(self.restaurant.rating_5_count, 1)
+        self.assertEqual(self.restaurant.rating_2_count, 1)
+        self.assertEqual(self.restaurant.average_rating, Decimal("3.5"))
+
+    def test_editing_review_should_move_rating_between_counters(self):
+        review = ReviewFactory(restaurant=self.restaurant, rating=2)
+        review.rating = 4
+        review.save()
+
+        self.restaurant.refresh_from_db()
+        self.assertEqual(self.restaurant.review_count, 1)
+        self.assertEqual(self.restaurant.rating_2_count, 0)
+        self.assertEqual(self.restaurant.rating_4_count, 1)
+        self.assertEqual(self.restaurant.average_rating, Decimal("4.0"))
+
+    def test_deleting_review_should_decrement_counters(self):
+        ReviewFactory(restaurant=self.restaurant, rating=5)
+        review = ReviewFactory(restaurant=self.restaurant, rating=1)
+        review.delete()
+
+        self.restaurant.refresh_from_db()
+        self.assertEqual(self.restaurant.review_count, 1)
+        self.assertEqual(self.restaurant.rating_1_count, 0)
+        self.assertEqual(self.restaurant.average_rating, Decimal("5.0"))
+
+    def test_review_views_should_keep_average_rating_current(self):
+        url = reverse("restaurants:add_review", kwargs={"restaurant_id": self.restaurant.id})
+        self.client.post(url, {"rating": 3, "comment": "Okay"})
+        self.restaurant.refresh_from_db()
+        self.assertEqual(self.restaurant.average_rating, Decimal("3.0"))
+
+        review = Review.objects.get(user=self.user, restaurant=self.restaurant)
+        self.client.post(reverse("restaurants:delete_review", kwargs={"pk": review.id}))
+        self.restaurant.refresh_from_db()
+        self.assertEqual(self.restaurant.review_count, 0)
+        self.assertEqual(self.restaurant.average_rating, Decimal("0.0"))
+
+    def test_counter_updates_should_compile_to_integer_params(self):
+        query = Restaurant.objects.all().query
+        compiler = query.get_compiler(connection=connection)
+        for added, removed in ((5, None), (None, 2), (4, 1)):
+            for expression in Restaurant.review_counter_updates(added, removed).values():
+                _, params = compiler.compile(expression.resolve_expression(query, allow_joins=False, for_save=True))
+                self.assertTrue(all(type(param) is int for param in params), params)
+
+    def test_rebuild_command_should_fix_drifted_counters(self):
+        ReviewFactory(restaurant=self.restaurant, rating=4)
+        Restaurant.objects.filter(pk=self.restaurant.pk).update(
+            review_count=10, rating_sum=3, rating_4_count=0, average_rating=0.3
+        )
+
+        call_command("rebuild_rating_counters", stdout=StringIO())
+
+        self.restaurant.refresh_from_db()
+        self.assertEqual(self.restaurant.review_count, 1)
+        self.assertEqual(self.restaurant.rating_sum, 4)
+        self.assertEqual(self.restaurant.rating_4_count, 1)
+        self.assertEqual(self.restaurant.average_rating, Decimal("4.0"))
+
+    def test_rebuild_command_should_retire_cached_fragments_and_list_pages(self):
+        fragment_version = self.restaurant.fragment_version
+        list_version = list_cache_version()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("rebuild_rating_counters", stdout=StringIO())
+
+        self.restaurant.refresh_from_db()
+        self.assertNotEqual(self.restaurant.fragment_version, fragment_version)
+        self.assertNotEqual(list_cache_version(), list_version)
+
+    def test_rating_stats_should_read_stored_histogram_without_queries(self):
+        ReviewFactory(restaurant=self.restaurant, rating=5)
+        ReviewFactory(restaurant=self.restaurant, rating=5)
+        ReviewFactory(restaurant=self.restaurant, rating=3)
+        self.restaurant.refresh_from_db()
+
+        with self.assertNumQueries(0):
+            stats = self.restaurant.get_rating_stats()
+
+        by_star = {item["star"]: item for item in stats}
+        self.assertEqual(by_star["5"]["count"], 2)
+        self.assertEqual(by_star["5"]["percentage"], 67)
+        self.assertEqual(by_star["3"]["count"], 1)
+        self.assertEqual(by_star["1"]["count"], 0)
+
+
+class TestImportCatalog(RestaurantTestSetupMixin, TestCase):
+    def write(self, name, content):
+        path = Path(tempfile.mkdtemp()) / name
+        path.write_text(content, encoding="utf-8")
+        return path
+
+    def test_should_upsert_restaurants_on_name_and_link_cuisines(self):
+        ReviewFactory(restaurant=self.restaurant, rating=4)
+        path = self.write("restaurants.csv", (
+            "name,city,address,cost_for_two,opening_time,closing_time,diet_type,cuisines,latitude,longitude\n"
+            f"{self.restaurant.name},Pune,1 Main St,500,18:00,02:00,Non-Veg,Thai|Italian,18.5,73.8\n"
+            "Curry House,Pune,2 Main St,300,10:00,22:00,veg,Indian,,\n"
+        ))
+
+        call_command("import_catalog", str(path), stdout=StringIO())
+
+        self.restaurant.refresh_from_db()
+        self.assertEqual(self.restaurant.city, "Pune")
+        self.assertEqual(self.restaurant.diet_type, DietType.NON_VEG)
+        self.assertEqual((self.restaurant.open_minute, self.restaurant.close_minute), (1080, 1560))
+        self.assertIsNotNone(self.restaurant.geo_cell)
+        self.assertEqual(self.restaurant.review_count, 1)
+        self.assertEqual(set(self.restaurant.cuisines.values_list("name", flat=True)), {"Thai", "Italian"})
+        self.assertEqual(Restaurant.objects.get(name="Curry House").cuisines.get().name, "Indian")
+
+    def test_should_report_bad_rows_and_import_the_rest(self):
+        path = self.write("restaurants.jsonl", (
+            '{"name": "Good", "city": "Pune", "address": "x", "cost_for_two": 100, '
+            '"opening_time": "09:00", "closing_time": "21:00"}\n'
+            '{"name": "Bad", "city": "Pune", "address": "x", "cost_for_two": "lots", '
+            '"opening_time": "09:00", "closing_time": "21:00"}\n'
+        ))
+        stderr = StringIO()
+
+        call_command("import_catalog", str(path), stdout=StringIO(), stderr=stderr)
+
+        self.assertTrue(Restaurant.objects.filter(name="Good").exists())
+        self.assertFalse(Restaurant.objects.filter(name="Bad").exists())
+        self.assertIn("row 2:", stderr.getvalue())
+
+    def test_should_match_dishes_on_restaurant_and_name(self):
+        food = FoodFactory(restaurant=self.restaurant, name="Paneer Tikka", price=100)
+        path = self.write("foods.jsonl", (
+            f'{{"restaurant": "{self.restaurant.name}", "name": "Paneer Tikka", "price": "150.00", '
+            '"diet_type": "Veg", "cuisines": ["Indian"]}\n'
+            f'{{"restaurant": "{self.restaurant.name}", "name": "Dal", "price": "90"}}\n'
+            '{"restaurant": "Nowhere", "name": "Soup", "price": "50"}\n'
+        ))
+        stderr = StringIO()
+
+        call_command("import_catalog", str(path), kind="foods", stdout=StringIO(), stderr=stderr)
+
+        food.refresh_from_db()
+        self.assertEqual(food.price, Decimal("150.00"))
+        self.assertEqual(list(food.cuisines.values_list("name", flat=True)), ["Indian"])
+        self.assertTrue(Food.objects.filter(restaurant=self.restaurant, name="Dal").exists())
+        self.assertIn("unknown restaurant 'Nowhere'", stderr.getvalue())
+
+    def test_resume_should_skip_rows_of_committed_batches(self):
+        path = self.write("restaurants.csv", (
+            "name,city,address,cost_for_two,opening_time,closing_time\n"
+            "First,Pune,x,100,09:00,21:00\n"
+            "Second,Pune,x,100,09:00,21:00\n"
+        ))
+        path.with_name(path.name + ".progress").write_text("1")
+
+        call_command("import_catalog", str(path), resume=True, stdout=StringIO())
+
+        self.assertFalse(Restaurant.objects.filter(name="First").exists())
+        self.assertTrue(Restaurant.objects.filter(name="Second").exists())
+        self.assertFalse(path.with_name(path.name + ".progress").exists())
+
+    def test_importers_must_implement_parse_and_save_batch(self):
+        class PartialImporter(CatalogImporter):
+            def parse(self, row):
+                return (row,)
+
+        with self.assertRaises(TypeError):
+            PartialImporter()
+
+    def test_list_cache_should_be_bumped_for_batches_committed_before_a_failure(self):
+        version = list_cache_version()
+        rows = [
+            {"name": name, "city": "Pune", "address": "x", "cost_for_two": 100,
+             "opening_time": "09:00", "closing_time": "21:00"}
+            for name in ("First", "Second")
+        ]
+        importer = RestaurantImporter(batch_size=1)
+        save_batch = importer.save_batch
+
+        def fail_second_batch(parsed, stats):
+            if stats.rows:
+                raise RuntimeError("disk full")
+            return save_batch(parsed, stats)
+
+        with mock.patch.object(importer, "save_batch", fail_second_batch), self.assertRaises(RuntimeError):
+            with self.captureOnCommitCallbacks(execute=True):
+                importer.run(iter(rows))
+
+        self.assertTrue(Restaurant.objects.filter(name="First").exists())
+        self.assertNotEqual(list_cache_version(), version)
+
+
+class TestExportCatalog(RestaurantTestSetupMixin, TestCase):
+    def read_jsonl(self, content):
+        return [json.loads(line) for line in content.splitlines()]
+
+    def test_command_should_export_rows_with_cuisines(self):
+        stdout = StringIO()
+        call_command("export_catalog", "restaurants", stdout=stdout, stderr=StringIO())
+
+        rows = {row["name"]: row for row in self.read_jsonl(stdout.getvalue())}
+        self.assertEqual(len(rows), Restaurant.objects.count())
+        self.assertEqual(rows[self.restaurant.name]["cuisines"], [self.cuisine.name])
+
+    def test_since_should_only_export_rows_updated_after_it(self):
+        Restaurant.objects.exclude(pk=self.restaurant.pk).update(
+            updated_at=datetime(2020, 1, 1, tzinfo=dt_timezone.utc)
+        )
+        stdout = StringIO()
+        call_command("export_catalog", "restaurants", since="2021-01-01", stdout=stdout, stderr=StringIO())
+
+        self.assertEqual([row["id"] for row in self.read_jsonl(stdout.getvalue())], [self.restaurant.pk])
+
+    def test_since_should_include_restaurants_with_new_ratings(self):
+        Restaurant.objects.update(updated_at=datetime(2020, 1, 1, tzinfo=dt_timezone.utc))
+        ReviewFactory(restaurant=self.restaurant, rating=4)
+        stdout = StringIO()
+        call_command("export_catalog", "restaurants", since="2021-01-01", stdout=stdout, stderr=StringIO())
+
+        rows = self.read_jsonl(stdout.getvalue())
+        self.assertEqual([row["id"] for row in rows], [self.restaurant.pk])
+        self.assertEqual(rows[0]["review_count"], 1)
+
+    def test_endpoint_should_be_staff_only_and_stream_csv(self):
+        url = reverse("restaurants:export_catalog", kwargs={"kind": "reviews"})
+        ReviewFactory(restaurant=self.restaurant, rating=5)
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get(url, {"format": "csv"})
+
+        self.assertTrue(response.streaming)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], "id,restaurant_id,user_id,rating,comment,created_at,updated_at")
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(self.client.get(url, {"since": "soon"}).status_code, 400)
+        self.assertEqual(self.client.get(url.replace("reviews", "users")).status_code, 404)
+
+    async def test_endpoint_should_stream_asynchronously_under_asgi(self):
+        self.user.is_staff = True
+        await self.user.asave()
+        await self.async_client.aforce_login(self.user)
+
+        response = await self.async_client.get(reverse("restaurants:export_catalog", kwargs={"kind": "foods"}))
+
+        content = b"".join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertIn(self.food.name, {row["name"] for row in self.read_jsonl(content)})
+
+
+def jpeg_upload(width=800, height=600, name="photo.jpg", gps=False):
+    # Rotated a quarter turn by its EXIF orientation, plus tags to strip
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    exif[0x010F] = "Camera Maker"
+    if gps:
+        exif[0x8825] = {1: "N", 2: (12.0, 58.0, 17.0), 3: "E", 4: (77.0, 35.0, 40.0)}
+    buffer = BytesIO()
+    Image.new("RGB", (width, height), "red").save(buffer, "JPEG", exif=exif)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/jpeg")
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), RESTAURANT_IMAGE_WORKERS=0)
+class TestImageProcessing(RestaurantTestSetupMixin, TestCase):
+    def test_upload_should_build_stripped_width_stepped_variants(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            image = RestaurantImage.objects.create(restaurant=self.restaurant, image=jpeg_upload())
+        image.refresh_from_db()
+
+        # Orientation 6 swaps width and height
+        self.assertEqual((image.image_width, image.image_height), (600, 800))
+        self.assertEqual(image.image_variants["source"], image.image.name)
+        for fmt in VARIANT_FORMATS:
+            self.assertEqual(list(image.image_variants[fmt]), ["320", "600"])
+            with default_storage.open(image.image_variants[fmt]["320"]) as f, Image.open(f) as variant:
+                self.assertEqual(variant.size, (320, 427))
+                self.assertFalse(variant.getexif())
+
+    def test_stored_original_should_have_no_exif(self):
+        image = RestaurantImage.objects.create(restaurant=self.restaurant, image=jpeg_upload(gps=True))
+
+        with default_storage.open(image.image.name) as f, Image.open(f) as original:
+            self.assertFalse(original.getexif())
+            # The orientation is applied to the pixels instead
+            self.assertEqual(original.size, (600, 800))
+
+    def test_card_should_render_srcset_and_lazy_loading(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            RestaurantImage.objects.create(restaurant=self.restaurant, image=jpeg_upload())
+
+        response = self.client.get(reverse("restaurants:restaurant_list"))
+
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, ".webp 320w")
+        self.assertContains(response, 'width="600" height="800" loading="lazy"')
+
+    def test_unreadable_upload_should_not_break_the_save(self):
+        with self.assertLogs("restaurants.images", "ERROR"), self.captureOnCommitCallbacks(execute=True):
+            image = RestaurantImageFactory(restaurant=self.restaurant)
+        image.refresh_from_db()
+
+        self.assertIsNone(image.image_width)
+        self.assertContains(self.client.get(self.restaurant.get_absolute_url()), image.image.url)
+
+    def test_command_should_process_images_saved_without_signals(self):
+        name = default_storage.save("food_images/dish.jpg", jpeg_upload())
+        Food.objects.filter(pk=self.food.pk).update(image=name)
+
+        stdout = StringIO()
+        call_command("process_images", stdout=stdout)
+
+        self.food.refresh_from_db()
+        self.assertEqual(self.food.image_width, 600)
+        self.assertIn("Food: 1 of 1", stdout.getvalue())
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), RESTAURANT_IMAGE_WORKERS=0)
+class TestContentHashedMedia(RestaurantTestSetupMixin, TestCase):
+    def test_identical_uploads_should_share_one_file(self):
+        first = RestaurantImage.objects.create(restaurant=self.restaurant, image=jpeg_upload(name="a.JPG"))
+        second = RestaurantImage.objects.create(restaurant=self.restaurants[0], image=jpeg_upload(name="b.jpg"))
+
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name, r"^restaurant_images/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$")
+
+    def test_shared_file_should_be_deleted_with_its_last_row(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = RestaurantImage.objects.create(restaurant=self.restaurant, image=jpeg_upload())
+            second = RestaurantImage.objects.create(restaurant=self.restaurants[0], image=jpeg_upload())
+        first.refresh_from_db()
+        second.refresh_from_db()
+        files = {first.image.name, *variant_names(first.image_variants)}
+        self.assertGreater(len(files), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(all(default_storage.exists(name) for name in files))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(any(default_storage.exists(name) for name in files))
+
+    def test_replaced_image_should_be_deleted_with_its_variants(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            image = RestaurantImage.objects.create(restaurant=self.restaurant, image=jpeg_upload())
+        image.refresh_from_db()
+        files = {image.image.name, *variant_names(image.image_variants)}
+
+        with self.captureOnCommitCallbacks(execute=True):
+            image.image = jpeg_upload(width=900, height=300)
+            image.save()
+        image.refresh_from_db()
+
+        self.assertFalse(any(default_storage.exists(name) for name in files))
+        self.assertEqual(image.image_variants["source"], image.image.name)
+
+    def test_media_should_be_served_immutable_with_etag(self):
+        image = RestaurantImage.objects.create(restaurant=self.restaurant, image=jpeg_upload())
+
+        response = self.client.get(image.image.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Cache-Control"], "public, max-age=31536000, immutable")
+        etag = response["ETag"]
+        self.assertIn(etag.strip('"'), image.image.name)
+        self.assertEqual(self.client.get(image.image.url, headers={"if-none-match": etag}).status_code, 304)
+
+    @override_settings(MEDIA_ACCEL_REDIRECT="/protected-media/")
+    def test_media_should_hand_off_to_nginx_when_configured(self):
+        image = RestaurantImage.objects.create(restaurant=self.restaurant, image=jpeg_upload())
+
+        response = self.client.get(image.image.url)
+
+        self.assertEqual(response["X-Accel-Redirect"], f"/protected-media/{image.image.name}")
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        self.assertEqual(response.content, b"")
+
+    def test_media_should_not_serve_outside_media_root(self):
+        with self.assertRaises(Http404):
+            serve_media(RequestFactory().get("/"), "../homebite/settings.py")
+        self.assertEqual(self.client.get("/media/restaurant_images/missing.jpg").status_code, 404)
+
+
+@override_settings(SERVER_TIMING=True)
+class TestRequestStats(QueryBudgetMixin, RestaurantTestSetupMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        reset_view_stats()
+
+    def test_response_should_carry_server_timing_and_stats(self):
+        url = reverse("restaurants:restaurant_list")
+        self.client.get(url)
+        response = self.client.get(url)
+
+        stats = response.request_stats
+        self.assertGreater(stats.queries, 0)
+        self.assertGreater(stats.template_seconds, 0)
+        self.assertGreater(stats.cache_hits, 0)
+        self.assertRegex(response["Server-Timing"], rf'db;dur=[\d.]+;desc="{stats.queries} queries", tpl;dur=')
+        self.assertWithinQueryBudget(response)
+        self.assertEqual(view_stats()["restaurants:restaurant_list"]["count"], 2)
+
+    def test_detail_should_stay_within_its_budget(self):
+        response = self.client.get(self.restaurant.get_absolute_url())
+
+        self.assertWithinQueryBudget(response)
+
+    @override_settings(QUERY_BUDGETS={"restaurants:restaurant_list": 1})
+    def test_going_over_budget_should_fail_the_request(self):
+        with self.assertRaisesMessage(QueryBudgetExceeded, "over its budget of 1"):
+            self.client.get(reverse("restaurants:restaurant_list"))
+
+    def test_stats_endpoint_should_be_staff_only(self):
+        self.client.get(reverse("restaurants:restaurant_list"))
+        self.assertEqual(self.client.get(reverse("request_stats")).status_code, 302)
+
+        self.user.is_staff = True
+        self.user.save()
+        data = self.client.get(reverse("request_stats")).json()
+
+        self.assertEqual(data["views"]["restaurants:restaurant_list"]["count"], 1)
+        self.assertIn("restaurants/list.html", data["templates"])
+
+    def test_streamed_body_queries_should_be_counted_once_sent(self):
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get(reverse("restaurants:export_catalog", kwargs={"kind": "restaurants"}))
+        self.assertNotIn("restaurants:export_catalog", view_stats())
+        self.assertNotIn("Server-Timing", response)
+        before_body = response.request_stats.queries
+
+        with CaptureQueriesContext(connection) as queries:
+            b"".join(response.streaming_content)
+
+        self.assertGreater(len(queries), 0)
+        totals = view_stats()["restaurants:export_catalog"]
+        self.assertEqual((totals["count"], totals["queries"]), (1, before_body + len(queries)))
+
+    async def test_async_streamed_body_queries_should_be_counted(self):
+        self.user.is_staff = True
+        await self.user.asave()
+        await self.async_client.aforce_login(self.user)
+
+        response = await self.async_client.get(reverse("restaurants:export_catalog", kwargs={"kind": "foods"}))
+        before_body = response.request_stats.queries
+        [chunk async for chunk in response.streaming_content]
+
+        self.assertGreater(response.request_stats.queries, before_body)
+        self.assertEqual(view_stats()["restaurants:export_catalog"]["queries"], response.request_stats.queries)
+
+    @override_settings(ROOT_URLCONF="restaurants.test_restaurants.async_urls")
+    async def test_async_views_should_be_counted(self):
+        response = await self.async_client.get(reverse("restaurants:restaurant_list"))
+
+        self.assertGreater(response.request_stats.queries, 0)
+        self.assertIn("db;dur=", response["Server-Timing"])
+
+
+class TestMetrics(RestaurantTestSetupMixin, TestCase):
+    def value(self, name, **labels):
+        metric = REGISTRY.metrics[name]
+        key = (name, tuple(str(labels[label]) for label in metric.labels))
+        return REGISTRY.collect().get(key, 0)
+
+    def test_hot_paths_should_be_counted(self):
+        combination = self.value("restaurant_list_filters_total", filters="diet_type+is_spotlight")
+        toggles = self.value("restaurant_toggles_total", kind="bookmark", state="set", bulk="false")
+        reviews = self.value("restaurant_review_writes_total", action="created")
+
+        self.client.get(reverse("restaurants:restaurant_list"), {"is_spotlight": "true", "diet_type": "1"})
+        self.client.post(reverse("restaurants:toggle_bookmark"), {"restaurant_id": self.restaurant.pk})
+        ReviewFactory(restaurant=self.restaurant)
+
+        self.assertEqual(self.value("restaurant_list_filters_total", filters="diet_type+is_spotlight"), combination + 1)
+        self.assertEqual(self.value("restaurant_toggles_total", kind="bookmark", state="set", bulk="false"), toggles + 1)
+        self.assertEqual(self.value("restaurant_review_writes_total", action="created"), reviews + 1)
+
+    def test_endpoint_should_render_prometheus_text(self):
+        self.client.get(reverse("restaurants:restaurant_list"))
+
+        with override_settings(METRICS_TOKEN="secret"):
+            response = self.client.get(reverse("metrics"), headers={"Authorization": "Bearer secret"})
+
+        self.assertEqual(response["Content-Type"], "text/plain; version=0.0.4; charset=utf-8")
+        text = response.content.decode()
+        self.assertIn("# TYPE http_request_duration_seconds histogram", text)
+        self.assertIn('http_request_duration_seconds_bucket{view="restaurants:restaurant_list",le="+Inf"}', text)
+        self.assertRegex(text, r'cache_lookups_total\{result="(hit|miss)"\} \d+')
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_endpoint_should_be_limited_to_token_holders_and_staff(self):
+        # Local addresses get no pass: a proxy on the same host forwards everyone
+        self.assertEqual(self.client.get(reverse("metrics"), REMOTE_ADDR="127.0.0.1").status_code, 403)
+        self.assertEqual(self.client.get(reverse("metrics"), headers={"Authorization": "Bearer wrong"}).status_code, 403)
+
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 200)
+
+    def test_histogram_buckets_should_be_cumulative(self):
+        registry = Registry()
+        histogram = Histogram("latency_seconds", "Latency.", labels=("view",), buckets=(0.1, 1), registry=registry)
+        for value in (0.05, 0.5, 5):
+            histogram.observe(value, view="list")
+
+        lines = registry.render().splitlines()
+
+        self.assertIn('latency_seconds_bucket{view="list",le="0.1"} 1', lines)
+        self.assertIn('latency_seconds_bucket{view="list",le="1"} 2', lines)
+        self.assertIn('latency_seconds_bucket{view="list",le="+Inf"} 3', lines)
+        self.assertIn('latency_seconds_count{view="list"} 3', lines)
+
+    def test_multiprocess_mode_should_add_up_every_process_file(self):
+        directory = tempfile.mkdtemp()
+        registry = Registry()
+        counter = Counter("jobs_total", "Jobs.", labels=("kind",), registry=registry)
+        # Left behind by another worker
+        Path(directory, "4242-1.json").write_text(json.dumps([["jobs_total", ["import"], 5]]))
+
+        with override_settings(METRICS_DIR=directory):
+            counter.inc(2, kind="import")
+            text = registry.render()
+
+        self.assertIn('jobs_total{kind="import"} 7', text.splitlines())
+
+    def test_multiprocess_mode_should_fold_exited_workers_into_the_archive(self):
+        directory = tempfile.mkdtemp()
+        registry = Registry()
+        counter = Counter("jobs_total", "Jobs.", labels=("kind",), registry=registry)
+        Path(directory, "4242-1.json").write_text(json.dumps([["jobs_total", ["import"], 5]]))
+
+        with override_settings(METRICS_DIR=directory), mock.patch("homebite.metrics.os.kill", side_effect=ProcessLookupError):
+            counter.inc(2, kind="import")
+            registry.render()
+            text = registry.render()
+
+        self.assertIn('jobs_total{kind="import"} 7', text.splitlines())
+        self.assertFalse(Path(directory, "4242-1.json").exists())
+        self.assertEqual(json.loads(Path(directory, "archive.json").read_text()), [["jobs_total", ["import"], 5]])
+
+
+class TestBenchmarkEndpoints(RestaurantTestSetupMixin, TestCase):
+    options = {"restaurants": 30, "foods": 60, "reviews": 300, "users": 20, "requests": 5}
+
+    def test_should_seed_skewed_reviews_and_write_a_baseline(self):
+        path = Path(tempfile.mkdtemp()) / "baseline.json"
+
+        call_command("benchmark_endpoints", save_baseline=str(path), stdout=StringIO(), **self.options)
+
+        scenarios = json.loads(path.read_text())["scenarios"]
+        self.assertEqual(set(scenarios), {"list", "detail", "menu", "reviews", "toggle"})
+        for result in scenarios.values():
+            self.assertEqual(result["requests"], 5)
+            self.assertLessEqual(result["p50_ms"], result["p95_ms"])
+            self.assertLessEqual(result["p95_ms"], result["p99_ms"])
+            self.assertGreater(result["queries"], 0)
+        # The seeded data is rolled back
+        self.assertFalse(Restaurant.objects.filter(name__startswith="Bench Restaurant").exists())
+
+    def test_should_fail_on_regressions_against_the_baseline(self):
+        path = Path(tempfile.mkdtemp()) / "baseline.json"
+        fast = {"requests": 5, "p50_ms": 0.001, "p95_ms": 0.001, "p99_ms": 0.001, "queries": 1.0, "rps": 1e9}
+        path.write_text(json.dumps({"scenarios": {"detail": fast}}))
+
+        with self.assertRaisesMessage(CommandError, "detail: queries/request 1.0"):
+            call_command("benchmark_endpoints", baseline=str(path), stdout=StringIO(), **self.options)
+
+    def test_popular_restaurants_should_get_more_reviews(self):
+        restaurants = RestaurantFactory.create_batch(20)
+        restaurant_ids = [restaurant.pk for restaurant in restaurants]
+        user_ids = bulk_create_users(50)
+
+        created = bulk_create_reviews(restaurant_ids, user_ids, 500, popularity_weights(len(restaurant_ids)))
+
+        counts = Review.objects.filter(restaurant_id__in=restaurant_ids).values("restaurant").annotate(n=Count("id"))
+        by_restaurant = {row["restaurant"]: row["n"] for row in counts}
+        self.assertGreater(by_restaurant[restaurant_ids[0]], 5 * by_restaurant.get(restaurant_ids[-1], 0))
+        self.assertEqual(created, sum(by_restaurant.values()))
+
+    def test_bulk_reviews_should_count_only_inserted_rows(self):
+        restaurant_ids = [restaurant.pk for restaurant in RestaurantFactory.create_batch(3)]
+        user_ids = bulk_create_users(2)
+
+        # Two users can't leave more than six distinct reviews
+        created = bulk_create_reviews(restaurant_ids, user_ids, 50, popularity_weights(3))
+
+        self.assertLessEqual(created, 6)
+        self.assertEqual(created, Review.objects.filter(restaurant_id__in=restaurant_ids).count())
@@ -1,14 +1,35 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
 
 app_name = "restaurants"
 
-urlpatterns = [
-    path("", views.RestaurantListView.as_view(), name="restaurant_list"),
-    path("<int:pk>/", views.RestaurantDetailView.as_view(), name="restaurant_detail"),
-    path("<int:restaurant_id>/foods/", views.FoodListView.as_view(), name="restaurant_foods"),
-    path("bookmark/toggle/", views.toggle_bookmark, name="toggle_bookmark"),
-    path("visited/toggle/", views.toggle_visited, name="toggle_visited"),
-    path("<int:restaurant_id>/add-review/", views.AddReviewView.as_view(), name="add_review"),
-    path("delete-review/<int:pk>/", views.DeleteReviewView.as_view(), name="delete_review"),
-]
+
+def build_urlpatterns(use_async_views=False):
+    # The list, detail and menu pages have ASGI-native versions in async_views.py
+    if use_async_views:
+        list_view = async_views.AsyncRestaurantListView.as_view()
+        detail_view = async_views.AsyncRestaurantDetailView.as_view()
+        foods_view = async_views.AsyncFoodListView.as_view()
+    else:
+        list_view = views.RestaurantListView.as_view()
+        detail_view = views.RestaurantDetailView.as_view()
+        foods_view = views.FoodListView.as_view()
+
+    return [
+        path("", list_view, name="restaurant_list"),
+        path("<int:pk>/", detail_view, name="restaurant_detail"),
+        path("<int:restaurant_id>/reviews/", views.review_list, name="review_list"),
+        path("<int:restaurant_id>/foods/", foods_view, name="restaurant_foods"),
+        path("dishes/", views.DishSearchView.as_view(), name="dish_search"),
+        path("bookmark/toggle/", views.toggle_bookmark, name="toggle_bookmark"),
+        path("visited/toggle/", views.toggle_visited, name="toggle_visited"),
+        path("bookmark/bulk/", views.bulk_bookmark, name="bulk_bookmark"),
+        path("visited/bulk/", views.bulk_visited, name="bulk_visited"),
+        path("export/<str:kind>/", views.export_catalog, name="export_catalog"),
+        path("<int:restaurant_id>/add-review/", views.AddReviewView.as_view(), name="add_review"),
+        path("delete-review/<int:pk>/", views.DeleteReviewView.as_view(), name="delete_review"),
+    ]
+
+
+urlpatterns = build_urlpatterns(getattr(settings, "RESTAURANTS_ASYNC_VIEWS", False))
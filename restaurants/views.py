@@ -1,12 +1,69 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from .models import Restaurant, Food, Cuisine, Bookmark, Visited, Review
 from django.views.generic import ListView, DetailView, CreateView, DeleteView, UpdateView
-from django.db.models import Count, Avg
+from django.db.models import Count, Avg, Exists, OuterRef, prefetch_related_objects
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from .forms import ReviewForm
 from django.urls import reverse
+from django.core.paginator import InvalidPage, Page
+from django.http import Http404
+from django.template.loader import render_to_string
+from urllib.parse import urlencode
 from django_filters.views import FilterView
-from .filters import RestaurantFilter
+from .filters import FoodFilter, RestaurantFilter
+from .managers import cover_images_prefetch
+from .metrics import TOGGLES, record_filter_combination
+from .pagination import KeysetPaginator, PrecountedPaginator, order_by_ids, validate_page_number
+from .cache import (
+    get_cached_list_count,
+    get_cached_list_page,
+    list_page_cache_key,
+    mark_user_flags,
+    normalize_list_params,
+    set_cached_list_count,
+    set_cached_list_page,
+    uncached_cards,
+)
+
+REVIEWS_PER_PAGE = 10
+REVIEW_ORDERING = ("-created_at", "-id")
+MENU_PAGE_SIZE = 24
+DISH_SEARCH_LIMIT = 50
+
+
+def paginate_reviews(restaurant, cursor=None):
+    reviews = restaurant.reviews.select_related('user')
+    return KeysetPaginator(reviews, REVIEW_ORDERING, REVIEWS_PER_PAGE).page(cursor)
+
+
+def menu_cuisines(restaurant):
+    on_menu = Food.cuisines.through.objects.filter(cuisine=OuterRef('pk'), food__restaurant=restaurant)
+    return Cuisine.objects.filter(Exists(on_menu)).order_by('name')
+
+
+def selected_menu_cuisine(request):
+    try:
+        return int(request.GET.get("cuisine", ""))
+    except ValueError:
+        return None
+
+
+def group_dishes_by_restaurant(dishes):
+    # [(restaurant, [dishes])], restaurants in the order of their best match
+    groups = {}
+    for dish in dishes:
+        groups.setdefault(dish.restaurant_id, (dish.restaurant, []))[1].append(dish)
+    return list(groups.values())
+
+
+def menu_context(restaurant, cuisine_id):
+    return {
+        "restaurant": restaurant,
+        "selected_cuisine": cuisine_id,
+        # Carried over by pagination.html's page links
+        "page_query": urlencode({"cuisine": cuisine_id}) if cuisine_id else "",
+    }
+
 # Create your views here.
 class RestaurantListView(FilterView):
     model = Restaurant
@@ -16,81 +73,198 @@ class RestaurantListView(FilterView):
     filterset_class = RestaurantFilter
     ordering = ['-average_rating']
 
-    def get_queryset(self):
-        qs = super().get_queryset().prefetch_related('images').with_user_bookmarks(self.request.user).with_user_visited(self.request.user)
-        return qs
+    def is_list_cacheable(self):
+        if not self.filterset.is_shareable():
+            return False
+        return not self.filterset.is_bound or self.filterset.is_valid()
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.is_list_cacheable():
+            return super().paginate_queryset(queryset, page_size)
+
+        page_number = self.kwargs.get(self.page_kwarg) or self.request.GET.get(self.page_kwarg) or 1
+        params = normalize_list_params(self.request.GET, self.filterset.filters)
+        key = list_page_cache_key(params, page_number)
+        cached = get_cached_list_page(key)
+
+        count = cached["count"] if cached else get_cached_list_count(params)
+        if count is None:
+            paginator = self.get_paginator(queryset, page_size)
+        else:
+            paginator = PrecountedPaginator(queryset, page_size, count=count)
+
+        try:
+            number = validate_page_number(paginator, page_number)
+        except InvalidPage as e:
+            raise Http404(str(e))
+
+        if cached:
+            page = Page(order_by_ids(queryset, cached["ids"]), number, paginator)
+        else:
+            page = paginator.page(number)
+            set_cached_list_page(key, [r.pk for r in page.object_list], paginator.count)
+            set_cached_list_count(params, paginator.count)
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        record_filter_combination(self.filterset)
+        # Iterating the page's queryset fills its result cache, which the template reuses
+        restaurants = mark_user_flags(context["restaurants"], self.request.user)
+        # Cover images are only needed for cards missing from the fragment cache
+        prefetch_related_objects(uncached_cards(restaurants), cover_images_prefetch())
+        return context
 
 class RestaurantDetailView(DetailView):
     model = Restaurant
     template_name = "restaurants/detail.html"  
     context_object_name = "restaurant"
 
-    def get_queryset(self):
-        return super().get_queryset().prefetch_related('images', 'cuisines', 'reviews__user').with_user_visited(self.request.user)
-    
     def get_context_data(self, **kwargs):
+        mark_user_flags([self.object], self.request.user)
         context = super().get_context_data(**kwargs)
-        context["reviews"] = self.object.reviews.select_related('user').all()
+        context["reviews"] = paginate_reviews(self.object)
         context["rating_stats"] = self.object.get_rating_stats()
+        # Lazy: only read when the template's cached fragments are missing
+        context["images"] = self.object.images.all()
+        context["cuisines"] = self.object.cuisines.all()
         return context
 
 
+def review_list(request, restaurant_id):
+    # "Load more" endpoint for the detail page's review list
+    restaurant = get_object_or_404(Restaurant, pk=restaurant_id)
+    reviews = paginate_reviews(restaurant, request.GET.get("cursor"))
+    html = render_to_string(
+        "reviews/review-page.html",
+        {"reviews": reviews, "restaurant": restaurant},
+        request=request,
+    )
+    return JsonResponse({"html": html, "next_cursor": reviews.next_cursor})
+
+
 class FoodListView(ListView):
     model = Food
     template_name = "foods/list.html"
     context_object_name = "foods"
+    paginate_by = MENU_PAGE_SIZE
 
     def get_queryset(self):
         self.restaurant = get_object_or_404(Restaurant, pk=self.kwargs['restaurant_id'])
-        return Food.objects.filter(restaurant=self.restaurant).prefetch_related('cuisines')
+        self.cuisine_id = selected_menu_cuisine(self.request)
+        return Food.objects.menu_for(self.restaurant, self.cuisine_id)
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['restaurant'] = self.restaurant
+        context.update(menu_context(self.restaurant, self.cuisine_id))
+        context['cuisines'] = menu_cuisines(self.restaurant)
+        return context
+
+class DishSearchView(FilterView):
+    model = Food
+    template_name = "foods/search.html"
+    context_object_name = "dishes"
+    filterset_class = FoodFilter
+
+    def get_queryset(self):
+        return Food.objects.select_related('restaurant').prefetch_related('cuisines').order_by('price', 'id')
+
+    def get_context_data(self, **kwargs):
+        # Top-k only, so the ordered LIMIT can stop early on the price indexes
+        dishes = list(kwargs.pop('object_list', self.object_list)[:DISH_SEARCH_LIMIT])
+        context = super().get_context_data(object_list=dishes, **kwargs)
+        context['restaurant_groups'] = group_dishes_by_restaurant(dishes)
         return context
 
+
 from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.http import require_POST
-from .models import Bookmark, Restaurant
+from django.db import IntegrityError, transaction
+from django.views.decorators.http import require_GET, require_POST
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from .exporters import EXPORTS, FORMATS, aexport_lines, export_lines, parse_since
 
-@require_POST
-@login_required
-def toggle_bookmark(request):
-    restaurant_id = request.POST.get("restaurant_id")
+def _parse_restaurant_ids(values):
     try:
-        restaurant = Restaurant.objects.get(id=restaurant_id)
-    except (Restaurant.DoesNotExist, ValueError, TypeError):
-        return redirect(request.META.get("HTTP_REFERER", "restaurants:restaurant_list"))
+        return sorted({int(value) for value in values})
+    except (TypeError, ValueError):
+        return None
 
-    bookmark, created = Bookmark.objects.get_or_create(
-        user=request.user,
-        restaurant=restaurant
-    )
 
-    if not created:
-        bookmark.delete()
+def _toggle(request, model, state_key):
+    restaurant_ids = _parse_restaurant_ids([request.POST.get("restaurant_id")])
+    if not restaurant_ids:
+        return JsonResponse({"error": "Invalid restaurant_id."}, status=400)
+
+    try:
+        with transaction.atomic():
+            state = model.objects.toggle(request.user, restaurant_ids[0])
+    except IntegrityError:
+        return JsonResponse({"error": "Restaurant not found."}, status=404)
+    TOGGLES.inc(kind=model._meta.model_name, state="set" if state else "cleared", bulk="false")
+    return JsonResponse({state_key: state})
+
+
+def _bulk_set(request, model, state_key):
+    restaurant_ids = _parse_restaurant_ids(request.POST.getlist("restaurant_id"))
+    state = request.POST.get(state_key, "").lower()
+    if not restaurant_ids or state not in ("true", "false"):
+        return JsonResponse({"error": f"Expected restaurant_id values and {state_key}=true|false."}, status=400)
+
+    try:
+        with transaction.atomic():
+            if state == "true":
+                model.objects.add_for(request.user, restaurant_ids)
+            else:
+                model.objects.remove_for(request.user, restaurant_ids)
+    except IntegrityError:
+        return JsonResponse({"error": "Restaurant not found."}, status=404)
+    TOGGLES.inc(kind=model._meta.model_name, state="set" if state == "true" else "cleared", bulk="true")
+    return JsonResponse({state_key: state == "true", "restaurant_ids": restaurant_ids})
+
 
-    return redirect(request.META.get("HTTP_REFERER", "restaurants:restaurant_list"))
+@require_POST
+@login_required
+def toggle_bookmark(request):
+    return _toggle(request, Bookmark, "bookmarked")
 
 @require_POST
 @login_required
 def toggle_visited(request):
-    restaurant_id = request.POST.get("restaurant_id")
-    try:
-        restaurant = Restaurant.objects.get(id=restaurant_id)
-    except (TypeError, ValueError, Restaurant.DoesNotExist):
-        return redirect(request.META.get("HTTP_REFERER", "restaurants:restaurant_list"))
+    return _toggle(request, Visited, "visited")
 
-    visited, created = Visited.objects.get_or_create(
-        user=request.user,
-        restaurant=restaurant
-    )
+@require_POST
+@login_required
+def bulk_bookmark(request):
+    return _bulk_set(request, Bookmark, "bookmarked")
 
-    if not created:
-        visited.delete()
+@require_POST
+@login_required
+def bulk_visited(request):
+    return _bulk_set(request, Visited, "visited")
 
-    return redirect(request.META.get("HTTP_REFERER", "restaurants:restaurant_list"))
+@require_GET
+@staff_member_required
+def export_catalog(request, kind):
+    if kind not in EXPORTS:
+        raise Http404
+    fmt = request.GET.get("format", "jsonl")
+    if fmt not in FORMATS:
+        return JsonResponse({"error": f"format must be one of {', '.join(FORMATS)}."}, status=400)
+    try:
+        since = parse_since(request.GET["since"]) if request.GET.get("since") else None
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    stream = aexport_lines if isinstance(request, ASGIRequest) else export_lines
+    response = StreamingHttpResponse(
+        stream(kind, fmt, since),
+        content_type="text/csv" if fmt == "csv" else "application/x-ndjson",
+    )
+    response["Content-Disposition"] = f'attachment; filename="{kind}.{fmt}"'
+    return response
 
 class AddReviewView(LoginRequiredMixin, UpdateView):  
     model = Review
@@ -112,8 +286,7 @@ class AddReviewView(LoginRequiredMixin, UpdateView):
         return context
 
     def form_valid(self, form):
-        review = form.save()
-        review.restaurant.update_average_rating()
+        form.save()
         return redirect("restaurants:restaurant_detail", pk=self.restaurant.id)
 
 class DeleteReviewView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
@@ -122,12 +295,5 @@ class DeleteReviewView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
     def test_func(self):
         return self.get_object().user == self.request.user
 
-    def delete(self, request, *args, **kwargs):
-        self.object = self.get_object()
-        restaurant = self.object.restaurant  # save restaurant before deletion
-        response = super().delete(request, *args, **kwargs)
-        restaurant.update_average_rating()  # update after deletion
-        return response
-
     def get_success_url(self):
         return reverse('restaurants:restaurant_detail', kwargs={'pk': self.object.restaurant.id})